@@ -0,0 +1,177 @@
+"""
+This module houses the benchmarks for the fruit_vendor feed parsing.
+It generates a synthetic feed, writes it raw and compressed, and
+times parse_file over each copy so compressed ingest can be compared
+with raw ingest. This code is run separately from the cli.
+
+Functions:
+    bench()
+    ingest()
+    generate_feed()
+    write_feed()
+    time_parse()
+"""
+import gzip
+import json
+import lzma
+import os
+import string
+import tempfile
+import time
+
+import click
+
+from fruit_vendor_parse import parse_file, zstandard
+
+
+def generate_feed(entries: int) -> list:
+    """
+    Generates a list of synthetic feed entries in the JSON feed format.
+
+    Args:
+        entries: The number of entries to generate
+
+    Returns:
+        List: List of dicts with COUNTRY, COMMODITY, FIXED_OVERHEAD
+            and VARIABLE_OVERHEAD keys
+
+    Raises
+        None
+    """
+    letters = string.ascii_uppercase
+    countries = [a + b for a in letters for b in letters]
+    feed = []
+    for index in range(entries):
+        commodity, country = divmod(index, len(countries))
+        # Commodity names are letters only to match the flat file format
+        name = ""
+        while True:
+            commodity, letter = divmod(commodity, len(letters))
+            name += letters[letter].lower()
+            if not commodity:
+                break
+        feed.append({
+            "COUNTRY": countries[country],
+            "COMMODITY": f"fruit{name}",
+            "FIXED_OVERHEAD": f"{index % 97 + 1:.2f}",
+            "VARIABLE_OVERHEAD": f"{(index % 13) / 4:.2f}",
+        })
+    return feed
+
+def write_feed(feed: list, directory: str, file_format: str) -> dict:
+    """
+    Writes the feed raw and with each available compression codec.
+
+    Args:
+        feed: List of feed entries from generate_feed
+        directory: Directory to write the feed files to
+        file_format: json or txt
+
+    Returns:
+        Dict: Codec name mapped to the path of the written file
+
+    Raises
+        None
+    """
+    if file_format == "json":
+        data = json.dumps(feed, indent=1).encode()
+    else:
+        data = "".join(
+            f"{entry['COMMODITY']} {entry['COUNTRY']} "
+            f"{entry['FIXED_OVERHEAD']} {entry['VARIABLE_OVERHEAD']}\n"
+            for entry in feed
+        ).encode()
+
+    compressors = {
+        "raw": ("", lambda raw: raw),
+        "gzip": (".gz", gzip.compress),
+        "xz": (".xz", lzma.compress),
+    }
+    if zstandard is not None:
+        compressors["zstd"] = (".zst", zstandard.ZstdCompressor().compress)
+
+    paths = {}
+    for codec, (extension, compress) in compressors.items():
+        path = os.path.join(directory, f"feed.{file_format}{extension}")
+        with open(path, "wb") as feed_file:
+            feed_file.write(compress(data))
+        paths[codec] = path
+    return paths
+
+def time_parse(file_path: str, repeat: int) -> float:
+    """
+    Times parse_file over a feed file and returns the best run.
+
+    Args:
+        file_path: Path to the feed file
+        repeat: Number of times to parse the file
+
+    Returns:
+        Float: The fastest parse time in seconds
+
+    Raises
+        None
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_file(file_path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+@click.group(no_args_is_help=True)
+def bench() -> None:
+    """
+    Benchmarks for the fruit_vendor feed parsing.
+    """
+    pass
+
+@bench.command()
+@click.option("--entries", type=click.INT, default=100000,
+              help="Number of entries in the generated feed")
+@click.option("--repeat", type=click.INT, default=3,
+              help="Number of timed parses of each file")
+@click.option("--file_format", type=click.Choice(["json", "txt"]),
+              default="json", help="Format of the generated feed")
+def ingest(entries: int, repeat: int, file_format: str) -> None:
+    """
+    Prints to stdout the ingest throughput of a generated feed, raw and
+    compressed with each available codec.
+
+    Prints to standard out the format:
+
+    CODEC | FILE_SIZE | SECONDS | MB/S OF RAW FEED | ENTRIES/S | RATIO
+
+    Args:
+
+        None
+
+    Returns:
+
+        None
+
+    Raises
+
+        None
+    """
+    feed = generate_feed(entries)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_feed(feed, directory, file_format)
+        raw_size = os.path.getsize(paths["raw"])
+        raw_time = None
+        print(f"{entries} entries, {raw_size / 1e6:.2f} MB raw {file_format}")
+        for codec, path in paths.items():
+            seconds = time_parse(path, repeat)
+            if raw_time is None:
+                raw_time = seconds
+            out_string = (
+                f"{codec:5} | {os.path.getsize(path) / 1e6:8.2f} MB | "
+                f"{seconds:7.3f} s | {raw_size / 1e6 / seconds:8.2f} MB/s | "
+                f"{entries / seconds:10.0f} entries/s | "
+                f"{seconds / raw_time:5.2f}x raw"
+            )
+            print(out_string)
+    return
+
+if __name__ == '__main__':
+    bench()
@@ -6,14 +6,26 @@ and list the countries and commodities
 
 Functions:
     fruit_vendor()
+    load_fruit_list()
+    open_store()
+    compute_cost()
+    cost_string()
+    print_cost()
+    print_values()
     cost()
     show()
+    stats()
+    record()
 """
 
 import click
+import datetime
 import sys
 
-from fruit_vendor_parse import parse_file
+from fruit_vendor_history import FeedHistory
+from fruit_vendor_parse import iter_file, parse_file
+from fruit_vendor_stats import compute_stats
+from fruit_vendor_store import FeedStore
 
 @click.group(no_args_is_help=True)
 def fruit_vendor() -> None:
@@ -24,14 +36,134 @@ def fruit_vendor() -> None:
     pass
 
 
+def load_fruit_list(file_path: str, quarantine: str, history: str,
+                    as_of: datetime.datetime) -> list:
+    """
+    Returns the list of Fruit objects for a command. Parses the data
+    file, or with as_of looks up the feed in effect at that time in
+    the feed history.
+    """
+    if as_of is None:
+        return parse_file(file_path, quarantine)
+
+    fruit_list = FeedHistory(history).as_of(as_of.timestamp())
+    if fruit_list is None:
+        error_string = (
+            f"Error: No feed was recorded in the history as of {as_of}."
+        )
+        print(error_string)
+        sys.exit(1)
+    return fruit_list
+
+
+def open_store(store: str, file_path: str, quarantine: str,
+               checkpoint: str) -> FeedStore:
+    """
+    Opens the SQLite feed store, loading the data file into it first
+    if the file has changed since it was last loaded. The caller closes
+    the store, using it as a context manager.
+    """
+    feed_store = FeedStore(store)
+    feed_store.load_file(file_path, quarantine, checkpoint)
+    return feed_store
+
+
+def compute_cost(fruit_list: list, commodity: str, price_per_ton: float,
+                 trade_volume: float) -> list:
+    """
+    Returns a list of dicts of the Fruit object under OBJECT and the
+    total trade cost under TOTAL_COST for each country that trades the
+    commodity, sorted greatest to least cost.
+    """
+    output = []
+
+    # Iterate through the list of objects and create a list of dicts
+    # with the object as a key and the total price as the value.
+    for fruit in fruit_list:
+        if commodity == fruit.commodity:
+            cost_dict = {}
+            cost_dict["OBJECT"] = fruit
+            total_cost = (trade_volume 
+                          * (price_per_ton + fruit.variable_overhead)
+                          + fruit.fixed_overhead)
+            # Round to the nearest cent
+            cost_dict["TOTAL_COST"] = round(total_cost, 2)
+            output.append(cost_dict)
+
+    # Sort the list by the cost. Greatest to least. Equal costs are
+    # listed by country, as the store lists them.
+    output.sort(key = lambda x: (-x["TOTAL_COST"], x["OBJECT"].country))
+    return output
+
+
+def cost_string(object_cost_dict: dict, price_per_ton: float,
+                trade_volume: float) -> str:
+    """
+    Returns the formatted cost output line for one country
+    COUNTRY | (PRICE_PER_TON + VARIABLE_OVERHEAD) 
+    * TRADE_VOLUME + FIXED_OVERHEAD
+    """
+    fruit = object_cost_dict["OBJECT"]
+    total_cost = object_cost_dict["TOTAL_COST"]
+    out_string = (
+        f"{fruit.country:3} {total_cost:9.2f} | "
+        f"(({price_per_ton:5.2f} + {fruit.variable_overhead:5.2f})"
+        f" * {trade_volume:5.2f}) + {fruit.fixed_overhead:5.2f}"
+    )
+    return out_string
+
+
+def print_cost(output: object, price_per_ton: float,
+               trade_volume: float) -> bool:
+    """
+    Prints the formatted cost output line for each country and returns
+    True if any were printed.
+    """
+    # Iterate through the output and print the correctly formatted 
+    # output
+    # COUNTRY | (PRICE_PER_TON + VARIABLE_OVERHEAD) 
+    # * TRADE_VOLUME + FIXED_OVERHEAD
+    found = False
+    for object_cost_dict in output:
+        found = True
+        print(cost_string(object_cost_dict, price_per_ton, trade_volume))
+    return found
+
+
+def print_values(key: str, values: object) -> None:
+    """
+    Prints the commodities or countries under a heading
+    """
+    print(key.upper() + ":")
+    for value in values:
+        print(value)
+
+
 @fruit_vendor.command(no_args_is_help=True)
 @click.option("--file_path", type=click.STRING,
               help="Fully qualified path for the JSON data file")
+@click.option("--quarantine", type=click.STRING,
+              help="Write rows that fail to parse to this file and "
+                   "continue instead of exiting")
+@click.option("--checkpoint", type=click.STRING,
+              help="Save the progress of loading a flat file into the "
+                   "store to this file so an interrupted load can resume. "
+                   "Ignored without --store")
+@click.option("--as-of", "as_of", type=click.DateTime(),
+              help="Price with the feed in effect at this local time "
+                   "from the feed history instead of the data file")
+@click.option("--history", type=click.STRING,
+              help="Directory of the feed history. Defaults to "
+                   "./Data/history")
+@click.option("--store", type=click.STRING,
+              help="Load the data file into this SQLite database and "
+                   "query it there. Ignored with --as-of")
 @click.argument("commodity", required=True, type=click.STRING)
 @click.argument("price_per_ton", required=True, type=click.FLOAT)
 @click.argument("trade_volume", required=True, type=click.FLOAT)
-def cost(file_path: str, commodity: str, price_per_ton: float, 
-         trade_volume: float) -> None:
+def cost(file_path: str, quarantine: str, checkpoint: str, history: str,
+         as_of: datetime.datetime, store: str, commodity: str,
+         price_per_ton: float, trade_volume: float) -> None:
     """
     Prints to stdout the total cost for a trade with each country for a 
     specific commodity.
@@ -58,8 +190,6 @@ def cost(file_path: str, commodity: str, price_per_ton: float,
         None
     """
 
-    output = []
-
     #check to make sure the values of price_per_ton and trade_volume
     # are greater than or equal to 0
     if price_per_ton < 0 or trade_volume < 0:
@@ -70,57 +200,54 @@ def cost(file_path: str, commodity: str, price_per_ton: float,
         print(error_string)
         sys.exit(1)
 
-    # Parse the JSON file and get back a list of objects
     commodity = commodity.lower()
-    fruit_list = parse_file(file_path)
-
-    # Iterate through the list of objects and create a list of dicts
-    # with the object as a key and the total price as the value.
-    for fruit in fruit_list:
-        if commodity == fruit.commodity:
-            cost_dict = {}
-            cost_dict["OBJECT"] = fruit
-            total_cost = (trade_volume 
-                          * (price_per_ton + fruit.variable_overhead)
-                          + fruit.fixed_overhead)
-            # Round to the nearest cent
-            cost_dict["TOTAL_COST"] = round(total_cost, 2)
-            output.append(cost_dict)
+    if store is not None and as_of is None:
+        # Filter and sort in SQLite so only one row is in memory at a
+        # time
+        with open_store(store, file_path, quarantine, 
+                        checkpoint) as feed_store:
+            output = feed_store.cost(commodity, price_per_ton, trade_volume)
+            found = print_cost(output, price_per_ton, trade_volume)
+    else:
+        # Parse the JSON file and get back a list of objects
+        fruit_list = load_fruit_list(file_path, quarantine, history, as_of)
+        output = compute_cost(fruit_list, commodity, price_per_ton, 
+                              trade_volume)
+        found = print_cost(output, price_per_ton, trade_volume)
 
-    # Check if the output list is empty. If so return that the fruit
+    # Check if the output is empty. If so return that the fruit
     # does not exist.
-    if not output:
+    if not found:
         error_string = (
             f"Commodity {commodity} was not found. "
             "Please run fruit_vendor_cli.py list commodity for valid values"
         )
         print(error_string)
         sys.exit(1)
-    # Sort the list by the cost. Greatest to least.
-    output.sort(key = lambda x: x["TOTAL_COST"], reverse=True)
-    
-    # Iterate through the output list and print the correctly formatted 
-    # output
-    # COUNTRY | (PRICE_PER_TON + VARIABLE_OVERHEAD) 
-    # * TRADE_VOLUME + FIXED_OVERHEAD
-    for object_cost_dict in output:
-        fruit = object_cost_dict["OBJECT"]
-        total_cost = object_cost_dict["TOTAL_COST"]
-        
-
-        out_string = (
-            f"{fruit.country:3} {total_cost:9.2f} | "
-            f"(({price_per_ton:5.2f} + {fruit.variable_overhead:5.2f})"
-            f" * {trade_volume:5.2f}) + {fruit.fixed_overhead:5.2f}"
-        )
-        print(out_string)       
     return
 
 @fruit_vendor.command(no_args_is_help=True)
 @click.option("--file_path", type=str,
               help="Fully qualified path for the JSON data file")
+@click.option("--quarantine", type=str,
+              help="Write rows that fail to parse to this file and "
+                   "continue instead of exiting")
+@click.option("--checkpoint", type=str,
+              help="Save the progress of loading a flat file into the "
+                   "store to this file so an interrupted load can resume. "
+                   "Ignored without --store")
+@click.option("--as-of", "as_of", type=click.DateTime(),
+              help="List the feed in effect at this local time from the "
+                   "feed history instead of the data file")
+@click.option("--history", type=str,
+              help="Directory of the feed history. Defaults to "
+                   "./Data/history")
+@click.option("--store", type=str,
+              help="Load the data file into this SQLite database and "
+                   "query it there. Ignored with --as-of")
 @click.argument("key", required=True, type=str)
-def show(file_path: str, key: str) -> None:
+def show(file_path: str, quarantine: str, checkpoint: str, history: str,
+         as_of: datetime.datetime, store: str, key: str) -> None:
     """
     Prints to stdout a list of all the commodities or countries in the 
     JSON data.
@@ -149,18 +276,139 @@ def show(file_path: str, key: str) -> None:
         print(*valid_keys, sep="\n")
         sys.exit(1)
     
-    # Parse the JSON file and get back a list of objects.
-    output = set()
-    fruit_list = parse_file(file_path)
+    if store is not None and as_of is None:
+        # SQLite lists the distinct values in alphabetical order
+        with open_store(store, file_path, quarantine, 
+                        checkpoint) as feed_store:
+            print_values(key, feed_store.distinct(key))
+    else:
+        # Parse the JSON file and get back a list of objects.
+        output = set()
+        fruit_list = load_fruit_list(file_path, quarantine, history, as_of)
 
-    # Iterate through the list of objects and create a list of
-    # commodities or countries.
-    for fruit in fruit_list:
-        output.add(getattr(fruit,key))
+        # Iterate through the list of objects and create a list of
+        # commodities or countries.
+        for fruit in fruit_list:
+            output.add(getattr(fruit,key))
 
-    # Print the possible key values in alphabetical order
-    print(key.upper() + ":")
-    print(*sorted(output), sep="\n")
+        # Print the possible key values in alphabetical order
+        print_values(key, sorted(output))
+    return
+
+@fruit_vendor.command()
+@click.option("--file_path", type=str,
+              help="Fully qualified path for the JSON data file")
+@click.option("--quarantine", type=str,
+              help="Write rows that fail to parse to this file and "
+                   "continue instead of exiting")
+@click.option("--checkpoint", type=str,
+              help="Save the progress of loading a flat file into the "
+                   "store to this file so an interrupted load can resume. "
+                   "Ignored without --store")
+@click.option("--as-of", "as_of", type=click.DateTime(),
+              help="Summarise the feed in effect at this local time from "
+                   "the feed history instead of the data file")
+@click.option("--history", type=str,
+              help="Directory of the feed history. Defaults to "
+                   "./Data/history")
+@click.option("--store", type=str,
+              help="Load the data file into this SQLite database and "
+                   "summarise it there. Ignored with --as-of")
+@click.option("--trade_volume", type=float, default=1.0,
+              help="Trade volume in tons used to pick the cheapest "
+                   "country. Defaults to 1")
+def stats(file_path: str, quarantine: str, checkpoint: str, history: str,
+          as_of: datetime.datetime, store: str, trade_volume: float) -> None:
+    """
+    Prints to stdout the count, the min, max and mean fixed and 
+    variable overhead of each commodity and country, and the cheapest 
+    country for each commodity.
+
+    Prints to standard out the format:
+
+    NAME COUNT | FIXED MIN MAX MEAN | VARIABLE MIN MAX MEAN | CHEAPEST
+
+    Args:
+
+        None
+
+    Returns:
+
+        None
+
+    Raises:
+
+        None
+    """
+    if trade_volume < 0:
+        error_string = (
+            "Error: trade_volume must be greater than or equal to zero."
+        )
+        print(error_string)
+        sys.exit(1)
+
+    # Summarise the feed in one pass. The data file and the store are
+    # streamed a row at a time.
+    if as_of is not None:
+        fruit_iter = load_fruit_list(file_path, quarantine, history, as_of)
+        commodity_stats, country_stats = compute_stats(fruit_iter, 
+                                                       trade_volume)
+    elif store is not None:
+        with open_store(store, file_path, quarantine, 
+                        checkpoint) as feed_store:
+            commodity_stats, country_stats = compute_stats(
+                feed_store.rows(), trade_volume)
+    else:
+        fruit_iter = iter_file(file_path, quarantine)
+        commodity_stats, country_stats = compute_stats(fruit_iter, 
+                                                       trade_volume)
+
+    for key, key_stats in [("commodity", commodity_stats), 
+                           ("country", country_stats)]:
+        print(key.upper() + ":")
+        for name in sorted(key_stats):
+            group = key_stats[name]
+            out_string = (
+                f"{name:10} {group.count:6d} | "
+                f"{group.fixed_min:7.2f} {group.fixed_max:7.2f} "
+                f"{group.fixed_mean():7.2f} | "
+                f"{group.variable_min:5.2f} {group.variable_max:5.2f} "
+                f"{group.variable_mean():5.2f}"
+            )
+            if key == "commodity":
+                out_string += f" | {group.cheapest}"
+            print(out_string)
+    return
+
+@fruit_vendor.command()
+@click.option("--file_path", type=str,
+              help="Fully qualified path for the JSON data file")
+@click.option("--history", type=str,
+              help="Directory of the feed history. Defaults to "
+                   "./Data/history")
+def record(file_path: str, history: str) -> None:
+    """
+    Records the data file as a new version in the feed history so it
+    can be used by cost and show with --as-of.
+
+    Args:
+
+        None
+
+    Returns:
+
+        None
+
+    Raises:
+
+        None
+    """
+    fruit_list = parse_file(file_path)
+    version = FeedHistory(history).record(fruit_list)
+    if version is None:
+        print("Feed is unchanged since the latest recorded version.")
+    else:
+        print(f"Recorded feed version {version}.")
     return
 
 @fruit_vendor.command()
@@ -0,0 +1,369 @@
+"""
+This module houses the versioned history of the fruit_vendor feed.
+Each reload of the feed is recorded as a new version holding only the
+rows that changed, so the overheads that applied at any point in time
+can be looked up to reprice historical trades.
+
+The history is stored in a directory as three append-only JSON lines
+files:
+
+    deltas.jsonl: the rows upserted and deleted by each version
+    snapshots.jsonl: full copies of the feed taken at compaction
+    index.jsonl: the timestamp, delta offset and snapshot offset of
+        each version, and the latest snapshot at or before it
+
+Index records are padded to INDEX_RECORD_SIZE bytes, so version n is
+found by seeking to n * INDEX_RECORD_SIZE. A point-in-time lookup
+bisects the index by seeking, reading one record per step rather than
+the whole index, then seeks to the latest snapshot at or before the
+version in effect and applies only the deltas recorded since that
+snapshot. A snapshot is taken once the
+delta rows recorded since the previous one outnumber the rows in the
+feed. This keeps a lookup to at most one feed's worth of delta rows,
+while the snapshots never take more space than the deltas they
+compact.
+
+A version only exists once its index record is written. The records
+left behind by an interrupted write are never indexed, and are
+truncated away before the next version is written.
+
+Classes:
+    FeedHistory
+
+"""
+import json
+import os
+import time
+
+from fruit_vendor_parse import Fruit
+
+# Size in bytes of each padded index record, newline included
+INDEX_RECORD_SIZE = 256
+
+
+class FeedHistory():
+    """
+    Class to record and look up versions of the feed.
+
+    Attributes:
+        history_path: Directory holding the history files
+
+    Methods:
+        version_count
+        read_versions
+        versions
+        repair
+        state
+        record
+        as_of
+    """
+    def __init__(self, history_path: str = None) -> None:
+        """
+        Initializes the feed history class object
+
+        Args:
+            history_path: Directory holding the history files. Defaults
+                to ./Data/history
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        if history_path is None:
+            cwd = os.getcwd()
+            history_path = f"{cwd}/Data/history"
+        self.history_path = history_path
+        self.deltas_path = os.path.join(history_path, "deltas.jsonl")
+        self.snapshots_path = os.path.join(history_path, "snapshots.jsonl")
+        self.index_path = os.path.join(history_path, "index.jsonl")
+
+    def append(self, path: str, record: dict, width: int = None) -> int:
+        """
+        Appends a record to a history file and syncs it to disk.
+
+        Args:
+            path: Path to the history file
+            record: The record to write as a JSON line
+            width: Pad the record with spaces to this many bytes,
+                newline included
+
+        Returns:
+            Int: The offset of the record in the file
+
+        Raises:
+            ValueError: If the record is longer than width
+        """
+        data = json.dumps(record).encode()
+        if width is not None:
+            if len(data) >= width:
+                raise ValueError(f"Record is longer than {width} bytes")
+            data = data.ljust(width - 1)
+        with open(path, "ab") as history_file:
+            offset = history_file.tell()
+            history_file.write(data + b"\n")
+            history_file.flush()
+            os.fsync(history_file.fileno())
+        return offset
+
+    def version_count(self) -> int:
+        """
+        Returns the number of versions in the index. A version is only
+        visible once its index record has been written in full, so a
+        record torn by an interrupted write is ignored.
+
+        Args:
+            None
+
+        Returns:
+            Int: The number of versions
+
+        Raises:
+            None
+        """
+        if not os.path.exists(self.index_path):
+            return 0
+        count = os.path.getsize(self.index_path) // INDEX_RECORD_SIZE
+        if count:
+            with open(self.index_path, "rb") as index_file:
+                index_file.seek(count * INDEX_RECORD_SIZE - 1)
+                if index_file.read(1) != b"\n":
+                    count -= 1
+        return count
+
+    def read_versions(self, start: int, stop: int) -> list:
+        """
+        Reads a range of records from the version index with one seek.
+
+        Args:
+            start: Position of the first version to read
+            stop: Position after the last version to read
+
+        Returns:
+            List: Dicts of version, timestamp, delta_offset,
+                snapshot_offset, snapshot_version and delta_rows
+
+        Raises:
+            None
+        """
+        if stop <= start:
+            return []
+        with open(self.index_path, "rb") as index_file:
+            index_file.seek(start * INDEX_RECORD_SIZE)
+            data = index_file.read((stop - start) * INDEX_RECORD_SIZE)
+        return [
+            json.loads(data[offset:offset + INDEX_RECORD_SIZE])
+            for offset in range(0, len(data), INDEX_RECORD_SIZE)
+        ]
+
+    def versions(self) -> list:
+        """
+        Reads the whole version index.
+
+        Args:
+            None
+
+        Returns:
+            List: Dicts of version, timestamp, delta_offset,
+                snapshot_offset, snapshot_version and delta_rows,
+                oldest first
+
+        Raises:
+            None
+        """
+        return self.read_versions(0, self.version_count())
+
+    def record_end(self, path: str, offset: int) -> int:
+        # Returns the offset just past the record at an offset
+        with open(path, "rb") as history_file:
+            history_file.seek(offset)
+            return offset + len(history_file.readline())
+
+    def repair(self, count: int) -> None:
+        """
+        Truncates each history file to the end of the last indexed
+        version, dropping the records of an interrupted write so that
+        the next version is not appended after them.
+
+        Args:
+            count: The number of versions from version_count()
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        index_end = count * INDEX_RECORD_SIZE
+        delta_end = snapshot_end = 0
+        if count:
+            latest = self.read_versions(count - 1, count)[0]
+            delta_end = self.record_end(self.deltas_path,
+                                        latest["delta_offset"])
+            if latest["snapshot_version"] is not None:
+                position = latest["snapshot_version"] - 1
+                snapshot = self.read_versions(position, position + 1)[0]
+                snapshot_end = self.record_end(self.snapshots_path,
+                                               snapshot["snapshot_offset"])
+        for path, end in [(self.index_path, index_end),
+                          (self.deltas_path, delta_end),
+                          (self.snapshots_path, snapshot_end)]:
+            if os.path.exists(path) and os.path.getsize(path) > end:
+                os.truncate(path, end)
+
+    def state(self, position: int) -> dict:
+        """
+        Rebuilds the feed at a version from the latest snapshot at or
+        before it and the deltas recorded since.
+
+        Args:
+            position: Position in the index of the version to rebuild
+
+        Returns:
+            Dict: (commodity, country) mapped to
+                (fixed_overhead, variable_overhead)
+
+        Raises:
+            None
+        """
+        rows = {}
+        target = self.read_versions(position, position + 1)[0]
+        start = -1
+        if target["snapshot_version"] is not None:
+            start = target["snapshot_version"] - 1
+            snapshot_offset = self.read_versions(
+                start, start + 1)[0]["snapshot_offset"]
+            with open(self.snapshots_path, "rb") as snapshot_file:
+                snapshot_file.seek(snapshot_offset)
+                snapshot = json.loads(snapshot_file.readline())
+            for commodity, country, fixed, variable in snapshot["rows"]:
+                rows[(commodity, country)] = (fixed, variable)
+
+        if start < position:
+            with open(self.deltas_path, "rb") as delta_file:
+                # Each delta is read from its indexed offset, so records
+                # that were never indexed are skipped.
+                for version in self.read_versions(start + 1, position + 1):
+                    delta_file.seek(version["delta_offset"])
+                    delta = json.loads(delta_file.readline())
+                    for commodity, country in delta["deletes"]:
+                        del rows[(commodity, country)]
+                    for (commodity, country, fixed, 
+                         variable) in delta["upserts"]:
+                        rows[(commodity, country)] = (fixed, variable)
+        return rows
+
+    def record(self, fruit_list: list, timestamp: float = None) -> int:
+        """
+        Records a parsed feed as a new version holding the rows that
+        changed since the latest version. A feed identical to the
+        latest version is not recorded.
+
+        Args:
+            fruit_list: List of Fruit objects from parse_file
+            timestamp: Time the feed took effect in seconds since the
+                epoch. Defaults to now.
+
+        Returns:
+            Int: The new version number, or None if nothing changed
+
+        Raises:
+            None
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        os.makedirs(self.history_path, exist_ok=True)
+        count = self.version_count()
+        self.repair(count)
+        previous = {}
+        delta_rows = 0
+        snapshot_version = None
+        if count:
+            latest = self.read_versions(count - 1, count)[0]
+            previous = self.state(count - 1)
+            delta_rows = latest["delta_rows"]
+            snapshot_version = latest["snapshot_version"]
+            # Versions are kept in time order for the index bisect
+            timestamp = max(timestamp, latest["timestamp"])
+
+        rows = {}
+        for fruit in fruit_list:
+            rows[(fruit.commodity, fruit.country)] = (
+                fruit.fixed_overhead, fruit.variable_overhead)
+        upserts = [
+            [*key, *value] for key, value in rows.items()
+            if previous.get(key) != value
+        ]
+        deletes = [list(key) for key in previous if key not in rows]
+        if count and not upserts and not deletes:
+            return None
+
+        version = count + 1
+        delta = {
+            "version": version,
+            "upserts": upserts,
+            "deletes": deletes,
+        }
+        delta_offset = self.append(self.deltas_path, delta)
+
+        # Compact once replaying the deltas would cost more than
+        # reading a snapshot of the feed.
+        delta_rows += len(upserts) + len(deletes)
+        snapshot_offset = None
+        if delta_rows > len(rows):
+            snapshot = {
+                "version": version,
+                "rows": [[*key, *value] for key, value in rows.items()],
+            }
+            snapshot_offset = self.append(self.snapshots_path, snapshot)
+            snapshot_version = version
+            delta_rows = 0
+
+        # The index record is written last so the version only becomes
+        # visible once its delta and snapshot are complete.
+        record = {
+            "version": version,
+            "timestamp": timestamp,
+            "delta_offset": delta_offset,
+            "snapshot_offset": snapshot_offset,
+            "snapshot_version": snapshot_version,
+            "delta_rows": delta_rows,
+        }
+        self.append(self.index_path, record, INDEX_RECORD_SIZE)
+        return version
+
+    def as_of(self, timestamp: float) -> list:
+        """
+        Looks up the feed in effect at a point in time. The index is
+        bisected by seeking to one record per step.
+
+        Args:
+            timestamp: Point in time in seconds since the epoch
+
+        Returns:
+            List: List of Fruit objects, or None if no version had been
+                recorded by then
+
+        Raises:
+            None
+        """
+        low, high = 0, self.version_count()
+        if high:
+            with open(self.index_path, "rb") as index_file:
+                while low < high:
+                    middle = (low + high) // 2
+                    index_file.seek(middle * INDEX_RECORD_SIZE)
+                    record = json.loads(index_file.read(INDEX_RECORD_SIZE))
+                    if record["timestamp"] <= timestamp:
+                        low = middle + 1
+                    else:
+                        high = middle
+        position = low - 1
+        if position < 0:
+            return None
+        rows = self.state(position)
+        return [
+            Fruit(commodity, country, fixed, variable)
+            for (commodity, country), (fixed, variable) in rows.items()
+        ]
@@ -0,0 +1,264 @@
+"""
+This module houses the code for fail-soft feed ingestion. Rows that
+cannot be parsed are written to a quarantine file instead of aborting
+the parse, and the progress of a flat file parse is checkpointed so an
+interrupted ingest can resume from the last offset the consumer
+stored.
+
+Both files are written as JSON lines so that a record torn by an
+interruption only loses that record.
+
+Classes:
+    Quarantine
+    Checkpoint
+
+"""
+import json
+import os
+
+class Quarantine():
+    """
+    Class to collect the rejected rows of a feed in a quarantine file.
+    Each rejected row is written as a JSON line:
+
+        {"file": ..., "line": ..., "offset": ..., "reason": ...,
+         "row": ...}
+
+    For both JSON and flat file feeds, line is the line number the row
+    starts on and offset is the byte offset of the row in the
+    decompressed feed.
+
+    Attributes:
+        quarantine_path: Path to the quarantine file
+        file_path: Path to the feed file being parsed
+        count: The number of rows rejected by this parse
+
+    Methods:
+        reject
+        size
+        close
+    """
+    def __init__(self, quarantine_path: str, file_path: str,
+                 size: int = 0) -> None:
+        """
+        Opens the quarantine file. A resumed parse keeps the first size
+        bytes of the quarantine file, which hold the rows rejected
+        before the checkpoint.
+
+        Args:
+            quarantine_path: Path to the quarantine file
+            file_path: Path to the feed file being parsed
+            size: The number of bytes of the quarantine file to keep
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        self.quarantine_path = quarantine_path
+        self.file_path = file_path
+        self.count = 0
+        if size and os.path.exists(quarantine_path):
+            self.file = open(quarantine_path, "r+b")
+            self.file.truncate(size)
+            self.file.seek(size)
+        else:
+            self.file = open(quarantine_path, "wb")
+
+    def reject(self, line: int, offset: int, reason: str,
+               row: object) -> None:
+        """
+        Writes a rejected row to the quarantine file.
+
+        Args:
+            line: The line number of the row in the feed
+            offset: The byte offset of the row in the decompressed feed
+            reason: Why the row was rejected
+            row: The raw row, a string or decoded JSON value
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        record = {
+            "file": self.file_path,
+            "line": line,
+            "offset": offset,
+            "reason": reason,
+            "row": row,
+        }
+        self.file.write(json.dumps(record).encode() + b"\n")
+        self.count += 1
+
+    def size(self) -> int:
+        """Flushes the quarantine file and returns its size in bytes"""
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class Checkpoint():
+    """
+    Class to record the progress of a flat file parse. The checkpoint
+    file starts with a header identifying the feed, followed by one
+    record per checkpoint holding the offset to resume from, the number
+    of lines parsed and the size of the quarantine file.
+
+    The parse only tracks its progress in the checkpoint. The consumer
+    of the parsed rows saves the checkpoint once it has stored the rows
+    it was given, so a resumed parse yields only the rows after the
+    checkpoint and nothing is held back for the rows before it.
+
+    Attributes:
+        checkpoint_path: Path to the checkpoint file
+        file_path: Path to the feed file being parsed
+        offset: The offset in the decompressed feed of the next line
+        line: The number of lines parsed
+        quarantine_size: The size of the quarantine file at the
+            checkpoint resumed from
+        quarantine: The Quarantine of the parse, if any
+
+    Methods:
+        resume
+        update
+        save
+        finish
+        close
+    """
+    def __init__(self, checkpoint_path: str, file_path: str) -> None:
+        """
+        Initializes the checkpoint class object and resumes from a
+        previous checkpoint of the same feed file.
+
+        Args:
+            checkpoint_path: Path to the checkpoint file
+            file_path: Path to the feed file being parsed
+
+        Returns:
+            None
+
+        Raises:
+            FileNotFoundError: If the feed file cannot be found
+        """
+        self.checkpoint_path = checkpoint_path
+        self.file_path = file_path
+        self.file = None
+        self.quarantine = None
+        self.offset, self.line, self.quarantine_size = self.resume()
+
+    def header(self) -> dict:
+        # A checkpoint only applies to the feed file it was written for
+        stat = os.stat(self.file_path)
+        return {
+            "file": os.path.abspath(self.file_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        }
+
+    def resume(self) -> tuple:
+        """
+        Reads back a previous checkpoint of the same feed file and opens
+        the checkpoint file for writing. A checkpoint of a different or
+        changed feed file is discarded.
+
+        Args:
+            None
+
+        Returns:
+            Tuple: (offset to resume from, number of lines parsed,
+                size of the quarantine file at the checkpoint)
+
+        Raises:
+            FileNotFoundError: If the feed file cannot be found
+        """
+        header = self.header()
+        offset = line = quarantine_size = 0
+        # Size of the checkpoint file up to the last complete record
+        good_size = 0
+
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "rb") as checkpoint_file:
+                for record_line in checkpoint_file:
+                    # A record without a newline was torn by the
+                    # interruption
+                    if not record_line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(record_line)
+                    except ValueError:
+                        break
+                    if not good_size:
+                        if record != header:
+                            break
+                    else:
+                        offset = record["offset"]
+                        line = record["line"]
+                        quarantine_size = record["quarantine_size"]
+                    good_size += len(record_line)
+
+        if good_size:
+            self.file = open(self.checkpoint_path, "r+b")
+            self.file.truncate(good_size)
+            self.file.seek(good_size)
+        else:
+            self.file = open(self.checkpoint_path, "wb")
+            self.file.write(json.dumps(header).encode() + b"\n")
+        return offset, line, quarantine_size
+
+    def update(self, offset: int, line: int) -> None:
+        """Records the progress of the parse up to the next line"""
+        self.offset = offset
+        self.line = line
+
+    def save(self) -> None:
+        """
+        Writes a checkpoint record of the progress of the parse and
+        syncs it to disk. Called by the consumer once every row parsed
+        so far has been stored.
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        if self.quarantine is not None:
+            self.quarantine_size = self.quarantine.size()
+        record = {
+            "offset": self.offset,
+            "line": self.line,
+            "quarantine_size": self.quarantine_size,
+        }
+        self.file.write(json.dumps(record).encode() + b"\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def finish(self) -> None:
+        """Removes the checkpoint file once the parse has completed"""
+        self.close()
+        os.remove(self.checkpoint_path)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
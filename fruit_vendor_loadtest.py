@@ -0,0 +1,607 @@
+"""
+This module houses the load test harness for quote serving. It drives
+the cost path with a configurable number of concurrent clients, mix of
+commodities and feed size, either in-process or against a quote server
+spawned as a separate process, and reports throughput, p50/p95/p99
+latency and peak memory. Server scenarios report the peak resident
+memory of the server process as max_rss_kb. In-process scenarios
+report the peak memory allocated while serving their requests as
+peak_allocated_kb, traced in a separate untimed pass so tracing does
+not skew the latencies. Results can be saved as a baseline and later
+runs compared against it to flag regressions. This code is run
+separately from the cli.
+
+Functions:
+    loadtest()
+    load()
+    serve()
+    parse_mix()
+    make_requests()
+    summarise()
+    run_inprocess()
+    run_server()
+    compare()
+
+Classes:
+    QuoteHandler
+    QuoteServer
+
+"""
+import http.client
+import http.server
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from fruit_vendor_bench import generate_feed
+from fruit_vendor_cli import compute_cost, cost_string
+from fruit_vendor_parse import parse_file
+
+# Latency, throughput and memory figures compared against the baseline.
+# Higher latency or memory or lower throughput than the baseline is a
+# regression.
+LATENCY_KEYS = ["p50", "p95", "p99"]
+THROUGHPUT_KEYS = ["throughput"]
+MEMORY_KEYS = ["max_rss_kb", "peak_allocated_kb"]
+
+
+class QuoteHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler for the quote server. Answers
+
+        GET /cost?commodity=mango&price_per_ton=53&trade_volume=405
+
+    with the output of the cost command, or 404 if the commodity is
+    not in the feed. The parsed feed is shared by all request threads
+    through the server's fruit_list attribute.
+    """
+    protocol_version = "HTTP/1.1"
+    # The headers and body are sent separately, so Nagle's algorithm
+    # would hold the body until the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        if url.path != "/cost":
+            self.respond(404, f"Error: {url.path} not found")
+            return
+        try:
+            commodity = query["commodity"][0].lower()
+            price_per_ton = float(query["price_per_ton"][0])
+            trade_volume = float(query["trade_volume"][0])
+        except (KeyError, ValueError):
+            self.respond(400, "Error: commodity, price_per_ton and "
+                              "trade_volume are required")
+            return
+
+        output = compute_cost(self.server.fruit_list, commodity,
+                              price_per_ton, trade_volume)
+        if not output:
+            self.respond(404, f"Commodity {commodity} was not found.")
+            return
+        self.respond(200, "\n".join(
+            cost_string(object_cost_dict, price_per_ton, trade_volume)
+            for object_cost_dict in output))
+
+    def respond(self, status: int, body: str) -> None:
+        data = body.encode() + b"\n"
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        # Logging every request would dominate the measured latency
+        pass
+
+
+class QuoteServer(http.server.ThreadingHTTPServer):
+    """
+    Threaded HTTP server for QuoteHandler. The listen backlog is raised
+    from 5 so concurrent clients connecting at once are not dropped and
+    retried a second later, which would show up as latency.
+    """
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def parse_mix(mix: str) -> dict:
+    """
+    Parses a request mix of the form mango=3,apple=1 into commodity
+    weights.
+
+    Args:
+        mix: Comma separated commodity=weight pairs. A commodity
+            without a weight has weight 1.
+
+    Returns:
+        Dict: Commodity mapped to its weight
+
+    Raises:
+        ValueError: If a weight is not a number
+    """
+    weights = {}
+    for pair in mix.split(","):
+        commodity, _, weight = pair.partition("=")
+        weights[commodity.strip().lower()] = float(weight or 1)
+    return weights
+
+def make_requests(weights: dict, count: int, seed: int) -> list:
+    """
+    Generates a reproducible list of cost requests.
+
+    Args:
+        weights: Commodity mapped to its share of the requests
+        count: The number of requests
+        seed: Seed for the random generator
+
+    Returns:
+        List: (commodity, price_per_ton, trade_volume) tuples
+
+    Raises:
+        None
+    """
+    generator = random.Random(seed)
+    commodities = generator.choices(list(weights), list(weights.values()),
+                                    k=count)
+    return [
+        (commodity, round(generator.uniform(1, 100), 2),
+         round(generator.uniform(1, 1000), 2))
+        for commodity in commodities
+    ]
+
+def percentile(latencies: list, fraction: float) -> float:
+    # Nearest-rank percentile of a sorted list
+    rank = max(1, math.ceil(fraction * len(latencies)))
+    return latencies[rank - 1]
+
+def peak_rss_kb(pid: int) -> int:
+    """
+    Returns the peak resident memory of a child process while it is
+    still running.
+
+    Args:
+        pid: Process id of a running child
+
+    Returns:
+        Int: Peak resident memory in KB, or None if unavailable
+
+    Raises:
+        None
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def milliseconds(seconds: float) -> str:
+    # Formats a latency for the results table
+    if seconds is None:
+        return "     n/a"
+    return f"{seconds * 1000:8.3f}"
+
+def summarise(latencies: list, errors: int, elapsed: float,
+              max_rss_kb: int = None, 
+              peak_allocated_kb: int = None) -> dict:
+    """
+    Summarises the latencies of a run. Failed requests are only
+    counted under errors, so they do not skew the throughput and
+    latency of the successful ones.
+
+    Args:
+        latencies: Latency of each successful request in seconds
+        errors: The number of failed requests
+        elapsed: Wall clock time of the run in seconds
+        max_rss_kb: Peak resident memory of the server in KB
+        peak_allocated_kb: Peak memory allocated by in-process
+            requests in KB
+
+    Returns:
+        Dict: requests and errors, throughput in successful requests
+            per second, mean, p50, p95, p99 and max latency in seconds,
+            or None if no request succeeded, and max_rss_kb and
+            peak_allocated_kb, or None if not measured
+
+    Raises:
+        None
+    """
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "mean": None,
+        "p50": None,
+        "p95": None,
+        "p99": None,
+        "max": None,
+        "max_rss_kb": max_rss_kb,
+        "peak_allocated_kb": peak_allocated_kb,
+    }
+    if latencies:
+        summary["mean"] = sum(latencies) / len(latencies)
+        summary["p50"] = percentile(latencies, 0.50)
+        summary["p95"] = percentile(latencies, 0.95)
+        summary["p99"] = percentile(latencies, 0.99)
+        summary["max"] = latencies[-1]
+    return summary
+
+def run_clients(send: object, requests: list, concurrency: int,
+                close: object = None) -> tuple:
+    """
+    Sends the requests from concurrent client threads, each sending its
+    next request as soon as the previous one completes.
+
+    Args:
+        send: Function taking the client state and a request and
+            returning True on success. The client state is a dict
+            private to each thread.
+        requests: The requests from make_requests
+        concurrency: The number of client threads
+        close: Function taking a client state to release, called after
+            a failed request and once the run is over
+
+    Returns:
+        Tuple: (List of latencies of the successful requests in
+            seconds, number of errors, elapsed seconds)
+
+    Raises:
+        None
+    """
+    latencies = [0.0] * len(requests)
+    failed = [False] * len(requests)
+    local = threading.local()
+    states = []
+
+    def client(index: int) -> None:
+        if not hasattr(local, "state"):
+            local.state = {}
+            states.append(local.state)
+        start = time.perf_counter()
+        try:
+            ok = send(local.state, requests[index])
+        except (OSError, http.client.HTTPException):
+            if close is not None:
+                close(local.state)
+            local.state.clear()
+            ok = False
+        latencies[index] = time.perf_counter() - start
+        failed[index] = not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(len(requests))))
+    elapsed = time.perf_counter() - start
+    if close is not None:
+        for state in states:
+            close(state)
+    latencies = [
+        latency for latency, fail in zip(latencies, failed) if not fail
+    ]
+    return latencies, sum(failed), elapsed
+
+def run_inprocess(fruit_list: list, requests: list,
+                  concurrency: int) -> dict:
+    """
+    Runs the requests against compute_cost in this process. The
+    requests are run a second time with tracemalloc to measure the
+    memory they allocate, as tracing every allocation would slow the
+    timed run.
+
+    Args:
+        fruit_list: The parsed feed
+        requests: The requests from make_requests
+        concurrency: The number of client threads
+
+    Returns:
+        Dict: The summary from summarise, with the peak memory
+            allocated by the requests under peak_allocated_kb
+
+    Raises:
+        None
+    """
+    def send(state: dict, request: tuple) -> bool:
+        commodity, price_per_ton, trade_volume = request
+        output = compute_cost(fruit_list, commodity, price_per_ton,
+                              trade_volume)
+        for object_cost_dict in output:
+            cost_string(object_cost_dict, price_per_ton, trade_volume)
+        return True
+
+    latencies, errors, elapsed = run_clients(send, requests, concurrency)
+
+    tracemalloc.start()
+    try:
+        run_clients(send, requests, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return summarise(latencies, errors, elapsed,
+                     peak_allocated_kb=peak // 1024)
+
+def run_server(file_path: str, requests: list, concurrency: int) -> dict:
+    """
+    Spawns a quote server process for the feed and runs the requests
+    against it over HTTP with one keep-alive connection per client.
+
+    Args:
+        file_path: Path to the feed file
+        requests: The requests from make_requests
+        concurrency: The number of client threads
+
+    Returns:
+        Dict: The summary from summarise, with the peak resident
+            memory of the server process under max_rss_kb
+
+    Raises:
+        None
+    """
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve",
+         f"--file_path={file_path}", "--port=0"],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        # The server prints its port once the feed is loaded
+        line = server.stdout.readline()
+        if not line:
+            print("Error: The quote server failed to start.")
+            sys.exit(1)
+        port = int(line.split()[-1])
+
+        def send(state: dict, request: tuple) -> bool:
+            if "connection" not in state:
+                state["connection"] = http.client.HTTPConnection(
+                    "127.0.0.1", port)
+            commodity, price_per_ton, trade_volume = request
+            query = urllib.parse.urlencode({
+                "commodity": commodity,
+                "price_per_ton": price_per_ton,
+                "trade_volume": trade_volume,
+            })
+            state["connection"].request("GET", f"/cost?{query}")
+            response = state["connection"].getresponse()
+            response.read()
+            return response.status in (200, 404)
+
+        def close(state: dict) -> None:
+            if "connection" in state:
+                state["connection"].close()
+
+        latencies, errors, elapsed = run_clients(send, requests,
+                                                 concurrency, close)
+        max_rss_kb = peak_rss_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+        server.stdout.close()
+    return summarise(latencies, errors, elapsed, max_rss_kb=max_rss_kb)
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares results against a baseline.
+
+    Args:
+        results: Scenario name mapped to its summary
+        baseline: Scenario name mapped to its baseline summary
+        tolerance: Allowed fractional change, 0.2 allows 20% worse
+
+    Returns:
+        List: A message for each regression
+
+    Raises:
+        None
+    """
+    regressions = []
+    for name, summary in results.items():
+        if name not in baseline:
+            continue
+        for key in LATENCY_KEYS:
+            # A run without a successful request has no latencies
+            if summary[key] is None or baseline[name][key] is None:
+                continue
+            limit = baseline[name][key] * (1 + tolerance)
+            if summary[key] > limit:
+                regressions.append(
+                    f"{name} {key} {summary[key] * 1000:.3f} ms is above "
+                    f"the baseline {baseline[name][key] * 1000:.3f} ms")
+        for key in THROUGHPUT_KEYS:
+            limit = baseline[name][key] * (1 - tolerance)
+            if summary[key] < limit:
+                regressions.append(
+                    f"{name} {key} {summary[key]:.1f} req/s is below "
+                    f"the baseline {baseline[name][key]:.1f} req/s")
+        for key in MEMORY_KEYS:
+            # Only one kind of memory is measured for each target, and
+            # resident memory is not available on every platform
+            if (summary.get(key) is None 
+                    or baseline[name].get(key) is None):
+                continue
+            limit = baseline[name][key] * (1 + tolerance)
+            if summary[key] > limit:
+                regressions.append(
+                    f"{name} {key} {summary[key] / 1024:.1f} MB is above "
+                    f"the baseline {baseline[name][key] / 1024:.1f} MB")
+    return regressions
+
+@click.group(no_args_is_help=True)
+def loadtest() -> None:
+    """
+    Load test harness for fruit_vendor quote serving.
+    """
+    pass
+
+@loadtest.command()
+@click.option("--file_path", type=click.STRING,
+              help="Fully qualified path for the JSON data file")
+@click.option("--port", type=click.INT, default=8080,
+              help="Port to listen on. 0 picks a free port")
+def serve(file_path: str, port: int) -> None:
+    """
+    Serves cost quotes over HTTP on localhost.
+
+    GET /cost?commodity=mango&price_per_ton=53&trade_volume=405
+
+    Args:
+
+        None
+
+    Returns:
+
+        None
+
+    Raises:
+
+        None
+    """
+    server = QuoteServer(("127.0.0.1", port), QuoteHandler)
+    server.fruit_list = parse_file(file_path)
+    print(f"Serving on port {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return
+
+@loadtest.command()
+@click.option("--file_path", type=click.STRING,
+              help="Feed file to load test with instead of generated "
+                   "feeds")
+@click.option("--entries", type=click.INT, multiple=True,
+              default=[1000, 10000],
+              help="Size of a generated feed. Repeat for several sizes")
+@click.option("--target", type=click.Choice(["inprocess", "server"]),
+              multiple=True, default=["inprocess", "server"],
+              help="Where to send the requests. Repeat for both")
+@click.option("--concurrency", type=click.INT, multiple=True,
+              default=[1, 8],
+              help="Number of concurrent clients. Repeat for several")
+@click.option("--requests", type=click.INT, default=1000,
+              help="Number of requests per scenario")
+@click.option("--mix", type=click.STRING,
+              help="Request mix as commodity=weight pairs, such as "
+                   "mango=3,apple=1. Defaults to every commodity in the "
+                   "feed equally")
+@click.option("--seed", type=click.INT, default=0,
+              help="Seed for the generated requests")
+@click.option("--baseline", type=click.STRING,
+              help="JSON file of baseline results to compare against")
+@click.option("--save_baseline", is_flag=True,
+              help="Write the results to the baseline file")
+@click.option("--tolerance", type=click.FLOAT, default=0.2,
+              help="Allowed fractional change from the baseline")
+def load(file_path: str, entries: tuple, target: tuple, concurrency: tuple,
+         requests: int, mix: str, seed: int, baseline: str,
+         save_baseline: bool, tolerance: float) -> None:
+    """
+    Prints to stdout the throughput, latency percentiles and peak
+    memory of the cost path for each combination of feed, target and
+    concurrency.
+
+    Prints to standard out the format:
+
+    SCENARIO | REQUESTS | ERRORS | REQ/S | P50 | P95 | P99 | MAX | MEMORY
+
+    MEMORY is the peak resident memory of the server process (rss) or
+    the peak memory allocated by in-process requests (allocated).
+
+    Exits with 1 if a scenario regressed against the baseline.
+
+    Args:
+
+        None
+
+    Returns:
+
+        None
+
+    Raises:
+
+        None
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        if file_path is not None:
+            feeds = [("file", file_path)]
+        else:
+            feeds = []
+            for size in entries:
+                feed_path = os.path.join(directory, f"feed{size}.json")
+                with open(feed_path, "w") as feed_file:
+                    json.dump(generate_feed(size), feed_file)
+                feeds.append((f"{size}", feed_path))
+
+        for feed_name, feed_path in feeds:
+            fruit_list = parse_file(feed_path)
+            if mix:
+                weights = parse_mix(mix)
+            else:
+                weights = dict.fromkeys(
+                    sorted({fruit.commodity for fruit in fruit_list}), 1)
+            request_list = make_requests(weights, requests, seed)
+
+            for target_name in target:
+                for clients in concurrency:
+                    name = f"{target_name}-{feed_name}-c{clients}"
+                    if target_name == "inprocess":
+                        summary = run_inprocess(fruit_list, request_list,
+                                                clients)
+                    else:
+                        summary = run_server(feed_path, request_list,
+                                             clients)
+                    results[name] = summary
+                    memory = "      n/a"
+                    for key, kind in [("max_rss_kb", "rss"),
+                                      ("peak_allocated_kb", "allocated")]:
+                        if summary[key] is not None:
+                            memory = f"{summary[key] / 1024:7.1f} MB {kind}"
+                    out_string = (
+                        f"{name:28} | {summary['requests']:6d} | "
+                        f"{summary['errors']:4d} | "
+                        f"{summary['throughput']:9.1f} req/s | "
+                        f"{milliseconds(summary['p50'])} | "
+                        f"{milliseconds(summary['p95'])} | "
+                        f"{milliseconds(summary['p99'])} | "
+                        f"{milliseconds(summary['max'])} ms | {memory}"
+                    )
+                    print(out_string)
+
+    regressions = []
+    if baseline is not None and not save_baseline:
+        if os.path.exists(baseline):
+            with open(baseline) as baseline_file:
+                regressions = compare(results, json.load(baseline_file),
+                                      tolerance)
+        else:
+            print(f"Error: Cannot find file name {baseline}")
+            sys.exit(1)
+    if baseline is not None and save_baseline:
+        with open(baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+        print(f"Saved baseline to {baseline}")
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+    return
+
+if __name__ == '__main__':
+    loadtest()
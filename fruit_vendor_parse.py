@@ -7,15 +7,68 @@ Classes:
     Fruit
 
 Functions:
+    feed_extension()
+    detect_compression()
+    open_feed()
+    iter_json_array()
+    iter_file()
+    parse_file()
+    iter_json()
     parse_json()
+    skip_feed()
+    iter_txt()
+    parse_txt()
 
 """
+import gzip
+import io
 import json
+import lzma
 import os
 import sys
 import time
 import re
 
+# zstandard is optional. Without it zstd compressed feeds are rejected
+# with an error, gzip and xz feeds are handled by the standard library.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from fruit_vendor_ingest import Checkpoint, Quarantine
+
+# Compressed feed file extensions and the codec used to read them.
+# feed.json.gz is parsed as a .json feed once the codec is stripped.
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+    '.xz': 'xz',
+}
+
+# Leading bytes of each compressed format. These take precedence over
+# the file extension so a compressed feed is read correctly whatever
+# it is named.
+MAGIC_BYTES = {
+    b"\x1f\x8b": 'gzip',
+    b"\x28\xb5\x2f\xfd": 'zstd',
+    b"\xfd7zXZ\x00": 'xz',
+}
+
+# Errors raised by the decompressors on a corrupt or truncated feed
+DECOMPRESSION_ERRORS = (OSError, EOFError, lzma.LZMAError)
+if zstandard is not None:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+# Size of each read from the feed when streaming JSON
+CHUNK_SIZE = 64 * 1024
+
+# Number of characters at the end of the buffer within which a decode
+# error may just be the chunk boundary cutting an entry short
+TRUNCATION_MARGIN = 32
+
 class Fruit():
     """
     Class to represent a single data entry from the the parsed
@@ -66,46 +119,305 @@ class Fruit():
         return out_string
 
 class ParseFile():
-    def __init__(self, file_path: str) -> None:
+    def __init__(self, file_path: str, quarantine_path: str = None,
+                 checkpoint: Checkpoint = None) -> None:
         self.file_path = file_path
+        self.quarantine_path = quarantine_path
+        self.checkpoint = checkpoint
         self.output = None
 
+    def iterate(self):
+        return iter(())
+
     def parse(self):
-        pass
+        self.output = list(self.iterate())
 
 class ParseJson(ParseFile):
 
-    def parse(self):
-        self.output = parse_json(self.file_path)
+    def iterate(self):
+        return iter_json(self.file_path, self.quarantine_path)
 
 class ParseTxt(ParseFile):
 
-    def parse(self):
-        self.output = parse_txt(self.file_path)
+    def iterate(self):
+        return iter_txt(self.file_path, self.quarantine_path,
+                        self.checkpoint)
 
 parser_list = {
     '.txt': ParseTxt,
     '.json': ParseJson,
 }
 
-def parse_file(file_path: str = None) -> list:
+def feed_extension(file_path: str) -> str:
+    """
+    Returns the feed format extension of a file path, ignoring any
+    compression extension. Data/feed.json.gz returns .json.
+
+    Args:
+        file_path: Path to the feed file
+
+    Returns:
+        String: The lower case format extension
+
+    Raises
+        None
+    """
+    root, file_extension = os.path.splitext(file_path)
+    if file_extension.lower() in COMPRESSION_EXTENSIONS:
+        _, file_extension = os.path.splitext(root)
+    return file_extension.lower()
+
+def detect_compression(file_path: str, header: bytes) -> str:
+    """
+    Determines the compression codec of a feed from its leading bytes,
+    falling back to the file extension.
+
+    Args:
+        file_path: Path to the feed file
+        header: The first bytes of the file
+
+    Returns:
+        String: gzip, zstd, xz or None for an uncompressed feed
+
+    Raises
+        None
+    """
+    for magic, codec in MAGIC_BYTES.items():
+        if header.startswith(magic):
+            return codec
+    _, file_extension = os.path.splitext(file_path)
+    return COMPRESSION_EXTENSIONS.get(file_extension.lower())
+
+def open_feed(file_path: str, text: bool = True) -> io.IOBase:
+    """
+    Opens a feed file for reading. Compressed feeds are decompressed on
+    the fly as the stream is read, so the decompressed feed is never
+    held in memory or written to disk.
+
+    Args:
+        file_path: Path to the feed file
+        text: Return a text stream rather than a binary stream
+
+    Returns:
+        IO: A text or binary stream over the decompressed feed
+
+    Raises
+        FileNotFoundError: If the file path cannot be found
+    """
+    with open(file_path, "rb") as raw:
+        header = raw.read(max(len(magic) for magic in MAGIC_BYTES))
+    codec = detect_compression(file_path, header)
+
+    # The decompressors open the file by name so that closing the
+    # stream also closes the file.
+    if codec == 'gzip':
+        stream = gzip.open(file_path, "rb")
+    elif codec == 'xz':
+        stream = lzma.open(file_path, "rb")
+    elif codec == 'zstd':
+        if zstandard is None:
+            error_string = (
+                f"Error: Cannot read zstd compressed file {file_path}. "
+                "Please install the zstandard package."
+            )
+            print(error_string)
+            sys.exit(1)
+        decompressor = zstandard.ZstdDecompressor()
+        stream = io.BufferedReader(decompressor.stream_reader(
+            open(file_path, "rb"), closefd=True))
+    else:
+        stream = open(file_path, "rb")
+    if not text:
+        return stream
+    # Line endings are left as they are so that character positions
+    # map back to byte offsets in the feed.
+    return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+
+def iter_json_array(stream: io.TextIOBase, chunk_size: int = CHUNK_SIZE,
+                    with_position: bool = False) -> object:
+    """
+    Yields each entry of the top level JSON array in a stream without
+    loading the whole document. Only a chunk of the stream and the
+    entry being decoded are held in memory at a time.
+
+    Args:
+        stream: Text stream containing a JSON array
+        chunk_size: Number of characters read from the stream at a time
+        with_position: Yield (locate, entry) tuples. locate() returns
+            the line number and the byte offset of the entry in the
+            UTF-8 encoded stream, and is only valid until the next
+            entry is requested. The position is worked out only when
+            asked for, as most entries never need it.
+
+    Returns:
+        Generator: The decoded entries of the array
+
+    Raises
+        JSONDecodeError: If there is an issue decoding the JSON. The
+            error also has the byte offset of the error in its
+            byte_offset attribute.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    # Line count of the text dropped from the buffer, so that errors
+    # report the line number in the feed rather than in the buffer.
+    lines_consumed = 0
+    chars_consumed = 0
+    bytes_consumed = 0
+    eof = False
+
+    def byte_offset(pos: int) -> int:
+        return bytes_consumed + len(buffer[:pos].encode("utf-8"))
+
+    def locate() -> tuple:
+        # Line and byte offset of the entry at the current position
+        line = lines_consumed + buffer.count("\n", 0, position) + 1
+        return line, byte_offset(position)
+
+    def fail(msg: str, pos: int) -> None:
+        error = json.JSONDecodeError(msg, buffer, pos)
+        error.lineno += lines_consumed
+        error.pos += chars_consumed
+        error.byte_offset = byte_offset(pos)
+        raise error
+
+    def next_token() -> str:
+        # Skips whitespace, reading more of the stream as needed, and
+        # returns the next character or an empty string at the end.
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            read_more()
+
+    def read_more() -> None:
+        # Drops the consumed text and appends the next chunk
+        nonlocal buffer, position, lines_consumed, chars_consumed, eof
+        nonlocal bytes_consumed
+        lines_consumed += buffer.count("\n", 0, position)
+        chars_consumed += position
+        bytes_consumed = byte_offset(position)
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    if next_token() != "[":
+        fail("Expecting '['", position)
+    position += 1
+    if next_token() == "]":
+        return
+
+    while True:
+        next_token()
+        try:
+            entry, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            # Only an error at the end of the buffer, or in a string
+            # still open there, can be cured by reading on. Anything
+            # else is a syntax error in the feed.
+            truncated = (
+                error.pos >= len(buffer) - TRUNCATION_MARGIN
+                or error.msg.startswith("Unterminated string")
+            )
+            if eof or not truncated:
+                fail(error.msg, error.pos)
+            # The entry continues in the next chunk
+            read_more()
+            continue
+        # A value that ends near the end of the buffer, such as a
+        # number, may continue in the next chunk.
+        if end >= len(buffer) - TRUNCATION_MARGIN and not eof:
+            read_more()
+            continue
+        if with_position:
+            yield locate, entry
+        else:
+            yield entry
+        position = end
+
+        token = next_token()
+        if token == "]":
+            return
+        if token != ",":
+            fail("Expecting ',' delimiter", position)
+        position += 1
+
+def get_parser(file_path: str = None, quarantine_path: str = None,
+               checkpoint: Checkpoint = None) -> ParseFile:
     if file_path is None:
         cwd = os.getcwd()
         file_path = f"{cwd}/Data/fruit_data.json"
-    _, file_extension = os.path.splitext(file_path)
-    parser = parser_list[file_extension](file_path)
+    file_extension = feed_extension(file_path)
+    return parser_list[file_extension](file_path, quarantine_path,
+                                       checkpoint)
+
+def iter_file(file_path: str = None, quarantine_path: str = None,
+              checkpoint: Checkpoint = None) -> object:
+    parser = get_parser(file_path, quarantine_path, checkpoint)
+    return parser.iterate()
+
+def parse_file(file_path: str = None, quarantine_path: str = None) -> list:
+    parser = get_parser(file_path, quarantine_path)
     parser.parse() 
     return parser.output
 
-def parse_json(file_path: str) -> list:
+def report_quarantine(quarantine: Quarantine) -> None:
     """
-    Parses the JSON in ./Data/fruit_data.json.
+    Prints a warning to stderr if any rows were quarantined.
+
+    Args:
+        quarantine: The Quarantine used by the parse
+
+    Returns:
+        None
+
+    Raises
+        None
+    """
+    if quarantine.count:
+        error_string = (
+            f"Warning: {quarantine.count} rows of {quarantine.file_path} "
+            f"were rejected and written to {quarantine.quarantine_path}"
+        )
+        print(error_string, file=sys.stderr)
+
+def parse_json(file_path: str, quarantine_path: str = None) -> list:
+    """
+    Parses the JSON in ./Data/fruit_data.json into a list. See
+    iter_json.
 
     Args:
         file_path: Usually defaults to ./Data/fruit_data.json.
+        quarantine_path: Path to write rejected entries to
 
     Returns:
         List: List of Fruit objects
+    """
+    return list(iter_json(file_path, quarantine_path))
+
+def iter_json(file_path: str, quarantine_path: str = None) -> object:
+    """
+    Parses the JSON in ./Data/fruit_data.json one entry at a time. The
+    file may be gzip, zstd or xz compressed.
+
+    If a quarantine path is given the parse is fail-soft. Entries that
+    are missing a field or hold an invalid value are written to the
+    quarantine file with their line, byte offset and the reason and the
+    parse continues. A JSON syntax error ends the parse, keeping the
+    entries loaded before it, and the generator returns True so that
+    a consumer can tell the parse stopped early.
+
+    Args:
+        file_path: Usually defaults to ./Data/fruit_data.json.
+        quarantine_path: Path to write rejected entries to
+
+    Returns:
+        Generator: The parsed Fruit objects. Returns True if a syntax
+            error ended the parse early.
 
     Raises
         JSONDecodeError: If there is an issue decoding the JSON
@@ -113,32 +425,71 @@ def parse_json(file_path: str) -> list:
         KeyError: If Json object is missing data for a required fruit 
             object attribute
     """
-    object_list = []
+    quarantine = None
+    stopped_early = False
         
     try:
-        with open(file_path) as fruit_data:
-            data = json.load(fruit_data)
+        if quarantine_path is not None:
+            quarantine = Quarantine(quarantine_path, file_path)
+        with open_feed(file_path) as fruit_data:
             # For each entry create a new Fruit object and store the
             # JSON data in its attributes.
-            for entry in data:
-                country = entry["COUNTRY"]
-                commodity = entry["COMMODITY"]
-                fixed_overhead = entry["FIXED_OVERHEAD"]
-                variable_overhead = entry["VARIABLE_OVERHEAD"]
-                fruit = Fruit(commodity, country, float(fixed_overhead),
-                              float(variable_overhead))
-                object_list.append(fruit)
+            for locate, entry in iter_json_array(fruit_data, 
+                                                 with_position=True):
+                reason = None
+                if not isinstance(entry, dict):
+                    reason = "entry is not a JSON object"
+                else:
+                    try:
+                        country = entry["COUNTRY"]
+                        commodity = entry["COMMODITY"]
+                        fixed_overhead = entry["FIXED_OVERHEAD"]
+                        variable_overhead = entry["VARIABLE_OVERHEAD"]
+                        fruit = Fruit(commodity, country, 
+                                      float(fixed_overhead),
+                                      float(variable_overhead))
+                    except KeyError as error:
+                        if quarantine is None:
+                            raise
+                        reason = f"missing expected field {error}"
+                    # float() rejects null and non-numeric overheads
+                    except (TypeError, ValueError) as error:
+                        reason = f"invalid value: {error}"
+                if reason is not None:
+                    line, offset = locate()
+                    if quarantine is None:
+                        error_string = (
+                            f"Error: Failed to parse the JSON file "
+                            f"{file_path}. Invalid entry on line {line}: "
+                            f"{reason}"
+                        )
+                        print(error_string)
+                        sys.exit(1)
+                    quarantine.reject(line, offset, reason, entry)
+                    continue
+                yield fruit
     # Catch exception if JSON file fails to load.
     except json.JSONDecodeError as error:
-        error_string= (
-            f"Error: Failed to parse the JSON file {error.doc}."
-            f"{error.msg} on line {error.lineno}"
-        )
-        print(error_string)
-        sys.exit(1)
+        if quarantine is not None:
+            # The following entries cannot be located after a syntax
+            # error so the parse stops here.
+            quarantine.reject(error.lineno, error.byte_offset, error.msg,
+                              None)
+            stopped_early = True
+        else:
+            error_string= (
+                f"Error: Failed to parse the JSON file {file_path}. "
+                f"{error.msg} on line {error.lineno}"
+            )
+            print(error_string)
+            sys.exit(1)
     except FileNotFoundError as error:
         print(f"Error: Cannot find file name {error.filename}")
         sys.exit(1)
+    # Catch exception if a compressed file is corrupt or truncated.
+    except DECOMPRESSION_ERRORS as error:
+        print(f"Error: Failed to decompress the file {file_path}. {error}")
+        sys.exit(1)
     # Catch exception if JSON file is missing a field but formatted 
     # correctly.
     except KeyError as error:
@@ -148,54 +499,162 @@ def parse_json(file_path: str) -> list:
         )
         print(error_string)
         sys.exit(1)
-    return object_list
+    finally:
+        if quarantine is not None:
+            quarantine.close()
+    if quarantine is not None:
+        report_quarantine(quarantine)
+    return stopped_early
 
-def parse_txt(file_path: str) -> list:
+def parse_txt(file_path: str, quarantine_path: str = None) -> list:
     """
-    Parses the data in ./Data/flat_file.txt.
+    Parses the data in ./Data/flat_file.txt into a list. See iter_txt.
 
     Args:
         file_path: Usually defaults to ./Data/flat_file.txt.
+        quarantine_path: Path to write rejected lines to
 
     Returns:
         List: List of Fruit objects
+    """
+    return list(iter_txt(file_path, quarantine_path))
+
+def skip_feed(stream: io.IOBase, offset: int) -> None:
+    """
+    Moves a binary feed stream forward to an offset in the decompressed
+    feed. Streams that cannot seek, such as zstd, are read and
+    discarded up to the offset.
+
+    Args:
+        stream: Binary stream from open_feed
+        offset: The offset in the decompressed feed
+
+    Returns:
+        None
+
+    Raises
+        None
+    """
+    if stream.seekable():
+        stream.seek(offset)
+        return
+    while offset > 0:
+        chunk = stream.read(min(offset, CHUNK_SIZE))
+        if not chunk:
+            break
+        offset -= len(chunk)
+
+def iter_txt(file_path: str, quarantine_path: str = None,
+             checkpoint: Checkpoint = None) -> object:
+    """
+    Parses the data in ./Data/flat_file.txt one line at a time. The
+    file may be gzip, zstd or xz compressed.
+
+    Lines may end in LF or CRLF. A line that is not valid UTF-8 is
+    rejected like a line that does not match the expected format.
+
+    If a quarantine path is given the parse is fail-soft. Rejected
+    lines are written to the quarantine file with their line number,
+    byte offset and the reason and the parse continues.
+
+    If a checkpoint is given the parse resumes from it, yielding only
+    the rows after it, and records its progress in the checkpoint after
+    each line. The consumer saves and finishes the checkpoint.
+
+    Args:
+        file_path: Usually defaults to ./Data/flat_file.txt.
+        quarantine_path: Path to write rejected lines to
+        checkpoint: Checkpoint to resume from and record progress in
+
+    Returns:
+        Generator: The parsed Fruit objects
 
     Raises
         FileNotFoundError: If the file path cannot be found
     """
-    object_list = []
+    quarantine = None
+
+    # Parse each line into an entry using regex
+    # Create a fruit object for each entry
+    # MANGO MX 31 1.24
+    # MANGO BR 20 1.42
+    regex_pattern = r"""
+        ^               # match beginning of the string
+            ([A-Za-z]+) # MANGO ManGO or mango
+            \s+         # allow for arbitrary space
+            ([A-Za-z]{2}) # Two chars only MX Mx or mx
+            \s+         
+            (\d*\.\d+|\d+) # 31 or 31.0
+            \s+
+            (\d*\.\d+|\d+) # 1 or 1.24
+        $               # match end of the string
+    """                 
+    pattern = re.compile(regex_pattern, re.VERBOSE)
 
     try:
-        with open(file_path) as fruit_data:
-            # Parse each line into an entry using regex
-            # Create a fruit object for each entry
-            # MANGO MX 31 1.24
-            # MANGO BR 20 1.42
-            regex_pattern = r"""
-                ^               # match beginning of the string
-                    ([A-Za-z]+) # MANGO ManGO or mango
-                    \s+         # allow for arbitrary space
-                    ([A-Za-z]{2}) # Two chars only MX Mx or mx
-                    \s+         
-                    (\d*\.\d+|\d+) # 31 or 31.0
-                    \s+
-                    (\d*\.\d+|\d+) # 1 or 1.24
-                $               # match end of the string
-            """                 
-            pattern = re.compile(regex_pattern, re.VERBOSE)
-            for line in fruit_data:
-                entry = pattern.match(line)
+        # Byte offset in the decompressed feed and line number of the
+        # next line to parse
+        offset = line_number = quarantine_size = 0
+        if checkpoint is not None:
+            offset = checkpoint.offset
+            line_number = checkpoint.line
+            quarantine_size = checkpoint.quarantine_size
+        if quarantine_path is not None:
+            quarantine = Quarantine(quarantine_path, file_path,
+                                    quarantine_size)
+        if checkpoint is not None:
+            checkpoint.quarantine = quarantine
+
+        with open_feed(file_path, text=False) as fruit_data:
+            # Skip the lines parsed before the checkpoint
+            if offset:
+                skip_feed(fruit_data, offset)
+            for raw_line in fruit_data:
+                line_offset = offset
+                line_number += 1
+                offset += len(raw_line)
+                # The progress is recorded before the row is handed
+                # over, so a checkpoint saved by the consumer covers it.
+                if checkpoint is not None:
+                    checkpoint.update(offset, line_number)
+                problem = None
+                try:
+                    line = raw_line.decode("utf-8")
+                except UnicodeDecodeError:
+                    # The replaced line is only kept for the quarantine
+                    line = raw_line.decode("utf-8", errors="replace")
+                    problem = "is not valid UTF-8"
+                # Accept both LF and CRLF line endings
+                line = line.rstrip("\r\n")
+                entry = None
+                if problem is None:
+                    entry = pattern.match(line)
+                    if entry is None:
+                        problem = "is not in the expected format"
                 if entry is None:
-                    raise "Error"
-                (commodity, country, fixed_overhead, 
-                 variable_overhead) = entry.groups()
+                    if quarantine is None:
+                        error_string = (
+                            f"Error: Failed to parse the file {file_path}. "
+                            f"Line {line_number} {problem}"
+                        )
+                        print(error_string)
+                        sys.exit(1)
+                    quarantine.reject(line_number, line_offset,
+                                      f"line {problem}", line)
+                else:
+                    (commodity, country, fixed_overhead, 
+                     variable_overhead) = entry.groups()
 
-                fruit = Fruit(commodity.lower(), country, float(fixed_overhead),
-                              float(variable_overhead))
-                object_list.append(fruit)
+                    yield Fruit(commodity.lower(), country, 
+                                float(fixed_overhead),
+                                float(variable_overhead))
     except FileNotFoundError as error:
         print(f"Error: Cannot find file name {error.filename}")
         sys.exit(1)
+    # Catch exception if a compressed file is corrupt or truncated.
+    except DECOMPRESSION_ERRORS as error:
+        print(f"Error: Failed to decompress the file {file_path}. {error}")
+        sys.exit(1)
     # Catch exception if JSON file is missing a field but formatted 
     # correctly.
     except KeyError as error:
@@ -205,4 +664,12 @@ def parse_txt(file_path: str) -> list:
         )
         print(error_string)
         sys.exit(1)
-    return object_list
+    finally:
+        if quarantine is not None:
+            if checkpoint is not None:
+                # The consumer may save the checkpoint after the parse
+                checkpoint.quarantine_size = quarantine.size()
+                checkpoint.quarantine = None
+            quarantine.close()
+    if quarantine is not None:
+        report_quarantine(quarantine)
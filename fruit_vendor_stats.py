@@ -0,0 +1,134 @@
+"""
+This module houses the code for the aggregate statistics of the feed.
+The per-commodity and per-country summaries are computed together in
+a single pass over any iterable of Fruit objects, holding one running
+summary per group rather than the rows, so the streaming parsers can
+summarise feeds of any size.
+
+Classes:
+    OverheadStats
+
+Functions:
+    compute_stats()
+
+"""
+
+
+class OverheadStats():
+    """
+    Class to hold the running summary of the overheads of one group
+    of the feed.
+
+    Attributes:
+        count: The number of rows in the group
+        fixed_min: The lowest fixed overhead
+        fixed_max: The highest fixed overhead
+        fixed_total: The sum of the fixed overheads
+        variable_min: The lowest variable overhead
+        variable_max: The highest variable overhead
+        variable_total: The sum of the variable overheads
+        cheapest: The member of the group with the lowest total
+            overhead for the trade volume
+        cheapest_overhead: The total overhead of the cheapest member
+
+    Methods:
+        add
+        fixed_mean
+        variable_mean
+    """
+    def __init__(self) -> None:
+        """
+        Initializes an empty summary
+
+        Args:
+            None
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        self.count = 0
+        self.fixed_min = float("inf")
+        self.fixed_max = float("-inf")
+        self.fixed_total = 0.0
+        self.variable_min = float("inf")
+        self.variable_max = float("-inf")
+        self.variable_total = 0.0
+        self.cheapest = None
+        self.cheapest_overhead = float("inf")
+
+    def add(self, member: str, fixed_overhead: float,
+            variable_overhead: float, trade_volume: float) -> None:
+        """
+        Adds a row to the summary.
+
+        Args:
+            member: The country or commodity of the row, used to track
+                the cheapest member of the group
+            fixed_overhead: The fixed overhead of the row
+            variable_overhead: The variable overhead of the row
+            trade_volume: The trade volume in tons used to compare the
+                total overhead of each member
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        self.count += 1
+        self.fixed_min = min(self.fixed_min, fixed_overhead)
+        self.fixed_max = max(self.fixed_max, fixed_overhead)
+        self.fixed_total += fixed_overhead
+        self.variable_min = min(self.variable_min, variable_overhead)
+        self.variable_max = max(self.variable_max, variable_overhead)
+        self.variable_total += variable_overhead
+
+        # The price per ton is the same for every country so the
+        # cheapest trade is the one with the lowest total overhead.
+        overhead = fixed_overhead + variable_overhead * trade_volume
+        if overhead < self.cheapest_overhead:
+            self.cheapest = member
+            self.cheapest_overhead = overhead
+
+    def fixed_mean(self) -> float:
+        return self.fixed_total / self.count
+
+    def variable_mean(self) -> float:
+        return self.variable_total / self.count
+
+
+def compute_stats(fruit_iter: object, trade_volume: float = 1.0) -> tuple:
+    """
+    Computes the per-commodity and per-country summaries of a feed in
+    one pass.
+
+    Args:
+        fruit_iter: Iterable of Fruit objects, such as iter_file
+        trade_volume: The trade volume in tons used to find the
+            cheapest country for each commodity
+
+    Returns:
+        Tuple: (Dict of commodity to OverheadStats,
+            Dict of country to OverheadStats)
+
+    Raises:
+        None
+    """
+    commodity_stats = {}
+    country_stats = {}
+    for fruit in fruit_iter:
+        stats = commodity_stats.get(fruit.commodity)
+        if stats is None:
+            stats = commodity_stats[fruit.commodity] = OverheadStats()
+        stats.add(fruit.country, fruit.fixed_overhead,
+                  fruit.variable_overhead, trade_volume)
+
+        stats = country_stats.get(fruit.country)
+        if stats is None:
+            stats = country_stats[fruit.country] = OverheadStats()
+        stats.add(fruit.commodity, fruit.fixed_overhead,
+                  fruit.variable_overhead, trade_volume)
+    return commodity_stats, country_stats
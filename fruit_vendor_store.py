@@ -0,0 +1,284 @@
+"""
+This module houses the optional SQLite storage backend for the feed.
+Parsed rows are streamed into an indexed local database in batches,
+and cost and show queries are answered by SQLite, so memory use stays
+bounded whatever the size of the feed.
+
+The fruit table is keyed on (commodity, country) and stored in key
+order, so rows for one commodity and the distinct commodities are read
+straight from the primary key. The country index serves the distinct
+country listing.
+
+Classes:
+    FeedStore
+
+"""
+import itertools
+import os
+import sqlite3
+import sys
+
+from fruit_vendor_ingest import Checkpoint
+from fruit_vendor_parse import Fruit, iter_file
+
+# Number of rows inserted per executemany call when loading a feed
+BATCH_SIZE = 10000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS fruit (
+        commodity TEXT NOT NULL,
+        country TEXT NOT NULL,
+        fixed_overhead REAL NOT NULL,
+        variable_overhead REAL NOT NULL,
+        PRIMARY KEY (commodity, country)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS fruit_country ON fruit (country);
+    CREATE TABLE IF NOT EXISTS source (
+        file_path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime INTEGER NOT NULL
+    );
+"""
+
+
+class FeedStore():
+    """
+    Class to load the feed into a SQLite database and query it.
+
+    Attributes:
+        store_path: Path to the SQLite database file
+        connection: The open sqlite3 connection
+
+    Methods:
+        load
+        load_file
+        rows
+        cost
+        distinct
+        close
+    """
+    def __init__(self, store_path: str) -> None:
+        """
+        Opens the database in WAL mode, so queries can run while a new
+        feed is being loaded, and creates the tables if needed.
+
+        Args:
+            store_path: Path to the SQLite database file
+
+        Returns:
+            None
+
+        Raises:
+            None
+        """
+        self.store_path = store_path
+        self.connection = sqlite3.connect(store_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        # SQLite's ROUND differs from Python's round() on some halves,
+        # so costs are rounded with round() to match the list path.
+        self.connection.create_function(
+            "round_cents", 1, lambda total: round(total, 2), 
+            deterministic=True)
+        self.connection.executescript(SCHEMA)
+
+    def source(self, file_path: str) -> tuple:
+        # Identifies the version of the data file that was loaded
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    def loaded_source(self) -> tuple:
+        return self.connection.execute(
+            "SELECT file_path, size, mtime FROM source").fetchone()
+
+    def load(self, fruit_iter: object, source: tuple = None,
+             batch_size: int = BATCH_SIZE,
+             checkpoint: Checkpoint = None) -> int:
+        """
+        Replaces the contents of the database with the rows of a feed.
+        The rows are inserted in batches inside a single transaction,
+        so queries see either the old feed or the new one.
+
+        With a checkpoint each batch is committed before the checkpoint
+        is saved, so an interrupted load resumes after the last batch
+        instead of starting over. Queries then see a partly loaded feed
+        until the load completes.
+
+        Args:
+            fruit_iter: Iterable of Fruit objects, such as iter_file
+            source: The data file the rows were parsed from, recorded
+                with the rows in the same transaction unless the parse
+                stopped early
+            batch_size: Number of rows inserted per batch
+            checkpoint: The Checkpoint the rows are parsed with
+
+        Returns:
+            Int: The number of rows loaded
+
+        Raises:
+            None
+        """
+        # iter_json returns True when a syntax error ended a fail-soft
+        # parse early. The rows before it are kept, but the file is not
+        # recorded as loaded so the next load parses it again.
+        stopped_early = False
+
+        def parsed():
+            nonlocal stopped_early
+            stopped_early = yield from fruit_iter
+
+        rows = (
+            (fruit.commodity, fruit.country, fruit.fixed_overhead,
+             fruit.variable_overhead)
+            for fruit in parsed()
+        )
+        count = 0
+        with self.connection:
+            # A resumed load keeps the rows committed before the
+            # checkpoint
+            if checkpoint is None or not checkpoint.line:
+                self.connection.execute("DELETE FROM fruit")
+                self.connection.execute("DELETE FROM source")
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO fruit VALUES (?, ?, ?, ?)",
+                    batch)
+                count += len(batch)
+                if checkpoint is not None:
+                    self.connection.commit()
+                    checkpoint.save()
+            if source is not None and not stopped_early:
+                self.connection.execute(
+                    "INSERT INTO source VALUES (?, ?, ?)", source)
+        if checkpoint is not None:
+            checkpoint.finish()
+        return count
+
+    def load_file(self, file_path: str = None, quarantine_path: str = None,
+                  checkpoint_path: str = None) -> int:
+        """
+        Streams a data file into the database unless it is already
+        loaded. With a checkpoint path an interrupted load of a flat
+        file resumes from the last batch committed.
+
+        Args:
+            file_path: Usually defaults to ./Data/fruit_data.json.
+            quarantine_path: Path to write rejected rows to
+            checkpoint_path: Path to save the load progress to
+
+        Returns:
+            Int: The number of rows loaded, or None if the database
+                was already current
+
+        Raises:
+            None
+        """
+        if file_path is None:
+            cwd = os.getcwd()
+            file_path = f"{cwd}/Data/fruit_data.json"
+        try:
+            source = self.source(file_path)
+        except FileNotFoundError as error:
+            print(f"Error: Cannot find file name {error.filename}")
+            sys.exit(1)
+        if self.loaded_source() == source:
+            return None
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = Checkpoint(checkpoint_path, file_path)
+        try:
+            fruit_iter = iter_file(file_path, quarantine_path, checkpoint)
+            return self.load(fruit_iter, source, checkpoint=checkpoint)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def rows(self) -> object:
+        """
+        Yields every row of the feed in key order.
+
+        Args:
+            None
+
+        Returns:
+            Generator: Fruit objects
+
+        Raises:
+            None
+        """
+        cursor = self.connection.execute(
+            """
+            SELECT commodity, country, fixed_overhead, variable_overhead
+            FROM fruit
+            ORDER BY commodity, country
+            """)
+        for commodity, country, fixed, variable in cursor:
+            yield Fruit(commodity, country, fixed, variable)
+
+    def cost(self, commodity: str, price_per_ton: float,
+             trade_volume: float) -> object:
+        """
+        Yields the total cost of a trade with each country for a
+        commodity, greatest to least, in the same order as
+        compute_cost.
+
+        Args:
+            commodity: The type of fruit being traded
+            price_per_ton: The cost per ton of the fruit in USD
+            trade_volume: The total volume of fruit in tons
+
+        Returns:
+            Generator: Dicts of the Fruit object under OBJECT and the
+                total cost under TOTAL_COST
+
+        Raises:
+            None
+        """
+        cursor = self.connection.execute(
+            """
+            SELECT commodity, country, fixed_overhead, variable_overhead,
+                   round_cents(? * (? + variable_overhead) 
+                               + fixed_overhead) AS total
+            FROM fruit
+            WHERE commodity = ?
+            ORDER BY total DESC, country
+            """,
+            (trade_volume, price_per_ton, commodity))
+        for commodity, country, fixed, variable, total_cost in cursor:
+            yield {
+                "OBJECT": Fruit(commodity, country, fixed, variable),
+                "TOTAL_COST": total_cost,
+            }
+
+    def distinct(self, key: str) -> object:
+        """
+        Yields the distinct commodities or countries in alphabetical
+        order.
+
+        Args:
+            key: commodity or country
+
+        Returns:
+            Generator: The distinct values
+
+        Raises:
+            ValueError: If the key is not commodity or country
+        """
+        if key not in ("commodity", "country"):
+            raise ValueError(f"Invalid key {key}")
+        cursor = self.connection.execute(
+            f"SELECT DISTINCT {key} FROM fruit ORDER BY {key}")
+        for (value,) in cursor:
+            yield value
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
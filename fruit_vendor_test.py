@@ -6,13 +6,26 @@ Classes:
     TestFruitVendor
 
 """
+import gzip
+import io
+import json
+import lzma
 import sys
 import os
+import tempfile
 import unittest
+from unittest import mock
 from click.testing import CliRunner
 
 from fruit_vendor_cli import fruit_vendor
-from fruit_vendor_parse import parse_json, Fruit
+from fruit_vendor_history import INDEX_RECORD_SIZE, FeedHistory
+from fruit_vendor_loadtest import (compare, make_requests, parse_mix, 
+                                   run_inprocess, run_server, summarise)
+from fruit_vendor_ingest import Checkpoint
+from fruit_vendor_parse import (iter_file, iter_json_array, parse_json,
+                                parse_txt, parse_file, zstandard, Fruit)
+from fruit_vendor_stats import compute_stats
+from fruit_vendor_store import FeedStore
 
 
 class TestFruitVendor(unittest.TestCase):
@@ -35,6 +48,39 @@ class TestFruitVendor(unittest.TestCase):
         test_cli_show_commodity
         test_cli_show_country
         test_cli_show_bad_key
+        test_parse_gzip_json
+        test_parse_xz_txt
+        test_parse_compressed_magic_bytes
+        test_parse_corrupt_compressed
+        test_iter_json_array_syntax_error
+        test_iter_json_array_split_number
+        test_parse_txt_bad_line
+        test_parse_txt_crlf
+        test_parse_txt_invalid_utf8
+        test_parse_txt_quarantine
+        test_parse_json_quarantine
+        test_parse_json_quarantine_offset
+        test_parse_json_invalid_value
+        test_parse_txt_checkpoint_resume
+        test_parse_txt_checkpoint_resume_compressed
+        test_history_as_of
+        test_history_unchanged_feed
+        test_history_compaction
+        test_history_interrupted_write
+        test_history_index_bisect
+        test_cli_cost_as_of
+        test_store_load_file
+        test_store_partial_load
+        test_cli_cost_store
+        test_cli_cost_store_ties
+        test_cli_show_store
+        test_compute_stats
+        test_cli_stats
+        test_loadtest_requests
+        test_loadtest_summarise
+        test_loadtest_compare
+        test_loadtest_inprocess
+        test_loadtest_server
 
     """
 
@@ -251,6 +297,583 @@ class TestFruitVendor(unittest.TestCase):
         self.assertIn(error_string,result.output)
         self.assertEqual(result.exit_code,1)
 
+    # Test compressed feeds
+    def temp_path(self, name: str) -> str:
+        """Return a path in a temp directory removed after the test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return os.path.join(directory.name, name)
+
+    def write_compressed(self, source: str, name: str, compress) -> str:
+        """Write a compressed copy of a Data file to a temp directory"""
+        path = self.temp_path(name)
+        with open(source, "rb") as raw, open(path, "wb") as compressed:
+            compressed.write(compress(raw.read()))
+        return path
+
+    def test_parse_gzip_json(self) -> None:
+        """Test a gzip compressed JSON file matches the raw file"""
+        cwd = os.getcwd()
+        source = f"{cwd}/Data/test_extended.json"
+        path = self.write_compressed(source, "feed.json.gz", gzip.compress)
+        self.assertEqual(repr(parse_file(path)), repr(parse_file(source)))
+
+    def test_parse_xz_txt(self) -> None:
+        """Test an xz compressed flat file matches the raw file"""
+        cwd = os.getcwd()
+        source = f"{cwd}/Data/flat_file.txt"
+        path = self.write_compressed(source, "feed.txt.xz", lzma.compress)
+        self.assertEqual(repr(parse_file(path)), repr(parse_file(source)))
+
+    def test_parse_compressed_magic_bytes(self) -> None:
+        """
+        Test a gzip compressed file without a compression extension is
+        detected by its magic bytes
+        """
+        cwd = os.getcwd()
+        source = f"{cwd}/Data/test_single_entry.json"
+        path = self.write_compressed(source, "feed.json", gzip.compress)
+        parsed_fruit = parse_file(path)[0]
+        self.assertEqual(parsed_fruit.commodity, "mango")
+        self.assertEqual(parsed_fruit.country, "MX")
+
+    def test_parse_corrupt_compressed(self) -> None:
+        """Test a truncated gzip compressed file"""
+        cwd = os.getcwd()
+        source = f"{cwd}/Data/test_extended.json"
+        path = self.write_compressed(source, "feed.json.gz",
+                                     lambda raw: gzip.compress(raw)[:40])
+        with self.assertRaises(SystemExit) as catch:
+            parse_file(path)
+        self.assertEqual(catch.exception.code, 1)
+
+    def test_iter_json_array_syntax_error(self) -> None:
+        """
+        Test a syntax error early in a large JSON array is reported
+        without reading the rest of the stream
+        """
+        entry = '{"COMMODITY": "mango", "COUNTRY": "MX"}'
+        document = "[" + entry + ", {bad}, " + ", ".join([entry] * 10000) + "]"
+        stream = io.StringIO(document)
+        entries = iter_json_array(stream, chunk_size=1024)
+        self.assertEqual(next(entries)["COUNTRY"], "MX")
+        with self.assertRaises(json.JSONDecodeError) as catch:
+            next(entries)
+        self.assertEqual(catch.exception.pos, document.index("bad"))
+        self.assertLess(stream.tell(), 2 * 1024)
+
+    def test_iter_json_array_split_number(self) -> None:
+        """Test numbers split across chunks are decoded whole"""
+        document = "[1.5, -20e3, 300, true]"
+        for chunk_size in range(1, len(document) + 1):
+            entries = list(iter_json_array(io.StringIO(document), chunk_size))
+            self.assertEqual(entries, [1.5, -20e3, 300, True])
+
+    # Test fail-soft parsing
+    def test_parse_txt_bad_line(self) -> None:
+        """Test a flat file with a line in the wrong format"""
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/test_bad_line.txt"
+        with self.assertRaises(SystemExit) as catch:
+            parse_txt(path)
+        self.assertEqual(catch.exception.code, 1)
+
+    def test_parse_txt_crlf(self) -> None:
+        """Test a flat file with CRLF line endings"""
+        path = self.temp_path("feed.txt")
+        with open(path, "wb") as feed_file:
+            feed_file.write(b"MANGO MX 31 1.24\r\nMANGO BR 20 1.42\r\n")
+        parsed_fruit = parse_txt(path)
+        self.assertEqual([fruit.country for fruit in parsed_fruit],
+                         ["MX", "BR"])
+        self.assertEqual(parsed_fruit[1].variable_overhead, 1.42)
+
+    def test_parse_txt_invalid_utf8(self) -> None:
+        """
+        Test a flat file line that is not valid UTF-8 is reported rather
+        than rewritten
+        """
+        path = self.temp_path("feed.txt")
+        with open(path, "wb") as feed_file:
+            feed_file.write(b"MANGO MX 31 1.24\nMANG\xff BR 20 1.42\n")
+        with self.assertRaises(SystemExit) as catch:
+            parse_txt(path)
+        self.assertEqual(catch.exception.code, 1)
+
+        quarantine_path = self.temp_path("quarantine.jsonl")
+        self.assertEqual(len(parse_txt(path, quarantine_path)), 1)
+        with open(quarantine_path) as quarantine_file:
+            rejected = [json.loads(line) for line in quarantine_file]
+        self.assertEqual(rejected[0]["reason"], "line is not valid UTF-8")
+        self.assertEqual(rejected[0]["offset"], 17)
+
+    def test_parse_txt_quarantine(self) -> None:
+        """Test a bad flat file line is quarantined and parsing continues"""
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/test_bad_line.txt"
+        quarantine_path = self.temp_path("quarantine.jsonl")
+        parsed_fruit = parse_txt(path, quarantine_path)
+        self.assertEqual([fruit.country for fruit in parsed_fruit],
+                         ["MX", "FR"])
+        with open(quarantine_path) as quarantine_file:
+            rejected = [json.loads(line) for line in quarantine_file]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(rejected[0]["line"], 2)
+        self.assertEqual(rejected[0]["offset"], 17)
+        self.assertEqual(rejected[0]["row"], "MANGO BR")
+
+    def test_parse_json_quarantine(self) -> None:
+        """Test a JSON entry with a missing field is quarantined"""
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/test_missing_field.json"
+        quarantine_path = self.temp_path("quarantine.jsonl")
+        self.assertEqual(parse_json(path, quarantine_path), [])
+        with open(quarantine_path) as quarantine_file:
+            rejected = [json.loads(line) for line in quarantine_file]
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(rejected[0]["line"], 2)
+        self.assertIn("FIXED_OVERHEAD", rejected[0]["reason"])
+
+    def test_parse_json_quarantine_offset(self) -> None:
+        """
+        Test JSON rejects record the byte offset of the row, as flat
+        file rejects do, across chunks and multibyte characters
+        """
+        path = self.temp_path("feed.json")
+        entry = ('{"COUNTRY": "MX", "COMMODITY": "mang\u00f3", '
+                 '"FIXED_OVERHEAD": 31, "VARIABLE_OVERHEAD": 1.24}')
+        bad = '{"COUNTRY": "BR", "COMMODITY": "mango"}'
+        document = ("[\r\n" + ",\r\n".join([entry] * 1500 + [bad]) 
+                    + ",\r\n{]")
+        with open(path, "wb") as feed_file:
+            feed_file.write(document.encode("utf-8"))
+        quarantine_path = self.temp_path("quarantine.jsonl")
+        self.assertEqual(len(parse_json(path, quarantine_path)), 1500)
+        with open(quarantine_path) as quarantine_file:
+            rejected = [json.loads(line) for line in quarantine_file]
+        raw = document.encode("utf-8")
+        self.assertEqual(rejected[0]["line"], 1502)
+        self.assertEqual(rejected[0]["offset"], raw.index(bad.encode()))
+        # The syntax error that ends the parse
+        self.assertEqual(rejected[1]["offset"], len(raw) - 1)
+
+    def test_parse_json_invalid_value(self) -> None:
+        """
+        Test JSON entries that are not objects or hold null or
+        non-numeric overheads are quarantined with the right reason
+        """
+        path = self.temp_path("feed.json")
+        entry = {"COUNTRY": "MX", "COMMODITY": "mango",
+                 "FIXED_OVERHEAD": 31, "VARIABLE_OVERHEAD": 1.24}
+        with open(path, "w") as feed_file:
+            json.dump([["mango"], {**entry, "FIXED_OVERHEAD": None},
+                       {**entry, "VARIABLE_OVERHEAD": "high"}, entry],
+                      feed_file)
+        quarantine_path = self.temp_path("quarantine.jsonl")
+        self.assertEqual(len(parse_json(path, quarantine_path)), 1)
+        with open(quarantine_path) as quarantine_file:
+            reasons = [json.loads(line)["reason"] 
+                       for line in quarantine_file]
+        self.assertEqual(reasons[0], "entry is not a JSON object")
+        self.assertTrue(reasons[1].startswith("invalid value"))
+        self.assertTrue(reasons[2].startswith("invalid value"))
+        with self.assertRaises(SystemExit) as catch:
+            parse_json(path)
+        self.assertEqual(catch.exception.code, 1)
+
+    def test_parse_txt_checkpoint_resume(self) -> None:
+        """
+        Test a store load of a flat file resumes from a checkpoint
+        rather than the start of the file
+        """
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/flat_file.txt"
+        checkpoint_path = self.temp_path("checkpoint.jsonl")
+        # Checkpoint after the first line as an interrupted load would.
+        # The empty store shows the first line is not parsed again.
+        with Checkpoint(checkpoint_path, path) as checkpoint:
+            checkpoint.update(len("MANGO MX 31 1.24\n"), 1)
+            checkpoint.save()
+
+        with FeedStore(self.temp_path("feed.db")) as feed_store:
+            feed_store.load_file(path, checkpoint_path=checkpoint_path)
+            self.assertEqual(
+                [fruit.country for fruit in feed_store.rows()], ["BR"])
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+    def test_parse_txt_checkpoint_resume_compressed(self) -> None:
+        """Test a compressed flat file parse resumes from a checkpoint"""
+        cwd = os.getcwd()
+        source = f"{cwd}/Data/flat_file.txt"
+        compressors = {".gz": gzip.compress, ".xz": lzma.compress}
+        if zstandard is not None:
+            compressors[".zst"] = zstandard.ZstdCompressor().compress
+        for extension, compress in compressors.items():
+            path = self.write_compressed(source, "feed.txt" + extension,
+                                         compress)
+            checkpoint_path = self.temp_path("checkpoint.jsonl")
+            with Checkpoint(checkpoint_path, path) as checkpoint:
+                checkpoint.update(len("MANGO MX 31 1.24\n"), 1)
+                checkpoint.save()
+            with Checkpoint(checkpoint_path, path) as checkpoint:
+                parsed_fruit = list(iter_file(path, checkpoint=checkpoint))
+            self.assertEqual([fruit.country for fruit in parsed_fruit],
+                             ["BR"])
+
+    # Test the feed history
+    def test_history_as_of(self) -> None:
+        """Test looking up the feed in effect at points in time"""
+        cwd = os.getcwd()
+        history = FeedHistory(self.temp_path("history"))
+        single = parse_json(f"{cwd}/Data/test_single_entry.json")
+        extended = parse_json(f"{cwd}/Data/test_extended.json")
+        self.assertEqual(history.record(single, timestamp=100), 1)
+        self.assertEqual(history.record(extended, timestamp=200), 2)
+        self.assertEqual(history.record(single, timestamp=300), 3)
+
+        self.assertIsNone(history.as_of(50))
+        self.assertEqual(repr(history.as_of(150)), repr(single))
+        self.assertEqual(repr(history.as_of(200)), repr(extended))
+        self.assertEqual(repr(history.as_of(350)), repr(single))
+
+    def test_history_unchanged_feed(self) -> None:
+        """Test an unchanged feed does not add a version"""
+        cwd = os.getcwd()
+        history = FeedHistory(self.temp_path("history"))
+        extended = parse_json(f"{cwd}/Data/test_extended.json")
+        self.assertEqual(history.record(extended, timestamp=100), 1)
+        self.assertIsNone(history.record(extended, timestamp=200))
+        self.assertEqual(len(history.versions()), 1)
+
+    def test_history_compaction(self) -> None:
+        """
+        Test a snapshot is taken once the deltas outnumber the rows in
+        the feed and lookups before and after it are unchanged
+        """
+        history = FeedHistory(self.temp_path("history"))
+        feeds = []
+        for version in range(4):
+            fixed_overhead = float(version)
+            feed = [Fruit("mango", "MX", fixed_overhead, 1.24),
+                    Fruit("mango", "BR", 20.0, 1.42)]
+            history.record(feed, timestamp=version)
+            feeds.append(feed)
+
+        snapshots = [version["snapshot_offset"] is not None
+                     for version in history.versions()]
+        self.assertEqual(snapshots, [False, True, False, False])
+        for version, feed in enumerate(feeds):
+            self.assertEqual(repr(history.as_of(version)), repr(feed))
+
+    def test_history_interrupted_write(self) -> None:
+        """
+        Test the records of a write interrupted before its index record
+        are ignored by lookups and dropped by the next write
+        """
+        history = FeedHistory(self.temp_path("history"))
+        feeds = [[Fruit("mango", "MX", float(version), 1.24)]
+                 for version in range(3)]
+        history.record(feeds[0], timestamp=0)
+        history.record(feeds[1], timestamp=1)
+
+        # A complete delta and torn delta, snapshot and index records
+        # as left by an interrupted write
+        history.append(history.deltas_path, 
+                       {"version": 3, "upserts": [["kiwi", "NZ", 1, 1]],
+                        "deletes": []})
+        for path in [history.deltas_path, history.snapshots_path, 
+                     history.index_path]:
+            with open(path, "ab") as history_file:
+                history_file.write(b'{"version": 3, "up')
+        self.assertEqual(repr(history.as_of(1)), repr(feeds[1]))
+
+        history.record(feeds[2], timestamp=2)
+        for version, feed in enumerate(feeds):
+            self.assertEqual(repr(history.as_of(version)), repr(feed))
+        with open(history.deltas_path) as delta_file:
+            deltas = [json.loads(line) for line in delta_file]
+        self.assertEqual([delta["version"] for delta in deltas], [1, 2, 3])
+
+    def test_history_index_bisect(self) -> None:
+        """
+        Test the index is fixed width and a lookup bisects it without
+        decoding every record
+        """
+        history = FeedHistory(self.temp_path("history"))
+        feeds = []
+        for version in range(64):
+            feed = [Fruit("mango", "MX", float(version), 1.24),
+                    Fruit("mango", "BR", 20.0, 1.42)]
+            history.record(feed, timestamp=version)
+            feeds.append(feed)
+        self.assertEqual(os.path.getsize(history.index_path),
+                         64 * INDEX_RECORD_SIZE)
+
+        with mock.patch.object(json, "loads", wraps=json.loads) as loads:
+            self.assertEqual(repr(history.as_of(40.5)), repr(feeds[40]))
+        self.assertLess(loads.call_count, 16)
+
+    def test_cli_cost_as_of(self) -> None:
+        """Test the cli cost command with the as-of option"""
+        cwd = os.getcwd()
+        history_path = self.temp_path("history")
+        history = FeedHistory(history_path)
+        extended = parse_json(f"{cwd}/Data/test_extended.json")
+        history.record(extended[:2], timestamp=0)
+        history.record(extended, timestamp=4102444800)
+
+        runner = CliRunner()
+        result = runner.invoke(fruit_vendor,
+                               ["cost", "--as-of=2000-01-01",
+                                f"--history={history_path}",
+                                "mango", "53", "405"])
+        out_string = (
+            "BR   22060.10 | ((53.00 +  1.42) * 405.00) + 20.00\n"
+            "MX   21999.20 | ((53.00 +  1.24) * 405.00) + 32.00\n"
+        )
+        self.assertEqual(out_string, result.output)
+        self.assertEqual(result.exit_code, 0)
+
+        result = runner.invoke(fruit_vendor,
+                               ["cost", "--as-of=1960-01-01",
+                                f"--history={history_path}",
+                                "mango", "53", "405"])
+        self.assertIn("Error: No feed was recorded", result.output)
+        self.assertEqual(result.exit_code, 1)
+
+    # Test the SQLite feed store
+    def test_store_load_file(self) -> None:
+        """
+        Test the store loads a data file in batches and only reloads it
+        once it changes
+        """
+        cwd = os.getcwd()
+        path = self.temp_path("feed.json")
+        with open(f"{cwd}/Data/test_extended.json") as source:
+            extended = source.read()
+        with open(path, "w") as feed_file:
+            feed_file.write(extended)
+
+        with FeedStore(self.temp_path("feed.db")) as feed_store:
+            self.assertEqual(feed_store.load(parse_file(path),
+                                             batch_size=4), 10)
+            self.assertEqual(feed_store.load_file(path), 10)
+            self.assertIsNone(feed_store.load_file(path))
+
+            with open(f"{cwd}/Data/test_single_entry.json") as source:
+                single = source.read()
+            with open(path, "w") as feed_file:
+                feed_file.write(single)
+            self.assertEqual(feed_store.load_file(path), 1)
+            self.assertEqual(list(feed_store.distinct("country")), ["MX"])
+
+    def test_store_partial_load(self) -> None:
+        """
+        Test a fail-soft load ended early by a JSON syntax error is not
+        recorded as loaded, so the next load parses the file again
+        """
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/test_bad_format.json"
+        quarantine_path = self.temp_path("quarantine.jsonl")
+        with FeedStore(self.temp_path("feed.db")) as feed_store:
+            self.assertEqual(feed_store.load_file(path, quarantine_path), 0)
+            self.assertIsNone(feed_store.loaded_source())
+            self.assertEqual(feed_store.load_file(path, quarantine_path), 0)
+
+    def test_cli_cost_store(self) -> None:
+        """
+        Test the cli cost command with the store option matches the
+        extended example
+        """
+        cwd = os.getcwd()
+        runner = CliRunner()
+        store = f"--store={self.temp_path('feed.db')}"
+        file_path = f"--file_path={cwd}/Data/test_extended.json"
+        result = runner.invoke(fruit_vendor, 
+                               ["cost", store, file_path, "mango", 
+                                "53", "405"])
+
+        out_string = (
+            "FR   22382.20 | ((53.00 +  2.24) * 405.00) + 10.00\n"
+            "US   22223.75 | ((53.00 +  1.75) * 405.00) + 50.00\n"
+            "BR   22060.10 | ((53.00 +  1.42) * 405.00) + 20.00\n"
+            "MX   21999.20 | ((53.00 +  1.24) * 405.00) + 32.00\n"
+            "MY   21879.05 | ((53.00 +  1.01) * 405.00) +  5.00\n"
+            "PH   21853.75 | ((53.00 +  0.95) * 405.00) +  4.00\n"
+        )
+        self.assertEqual(out_string, result.output)
+        self.assertEqual(result.exit_code, 0)
+
+        result = runner.invoke(fruit_vendor, 
+                               ["cost", store, file_path, "kiwi", 
+                                "5.0", "50.0"])
+        self.assertIn("Commodity kiwi was not found.", result.output)
+        self.assertEqual(result.exit_code, 1)
+
+    def test_cli_cost_store_ties(self) -> None:
+        """
+        Test costs equal to the cent are listed in the same order with
+        and without the store
+        """
+        path = self.temp_path("feed.json")
+        feed = [
+            {"COUNTRY": country, "COMMODITY": "mango",
+             "FIXED_OVERHEAD": fixed, "VARIABLE_OVERHEAD": 1}
+            for country, fixed in [("ZA", 10.004), ("MX", 10.001),
+                                   ("BR", 10.0), ("FR", 12.0)]
+        ]
+        with open(path, "w") as feed_file:
+            json.dump(feed, feed_file)
+
+        runner = CliRunner()
+        command = ["cost", f"--file_path={path}", "mango", "1", "1"]
+        result = runner.invoke(fruit_vendor, command)
+        store_result = runner.invoke(
+            fruit_vendor, 
+            command + [f"--store={self.temp_path('feed.db')}"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(
+            [line.split()[0] for line in result.output.splitlines()],
+            ["FR", "BR", "MX", "ZA"])
+        self.assertEqual(store_result.output, result.output)
+
+    def test_cli_show_store(self) -> None:
+        """
+        Test the cli show command with the store option
+        """
+        cwd = os.getcwd()
+        runner = CliRunner()
+        store = f"--store={self.temp_path('feed.db')}"
+        file_path = f"--file_path={cwd}/Data/test_extended.json"
+        result = runner.invoke(fruit_vendor, 
+                               ["show", "commodity", store, file_path])
+
+        out_string = (
+            "COMMODITY:\n"
+            "apple\n"
+            "banana\n"
+            "mango\n"
+            "orange\n"
+            "pineapple\n"
+        )
+        self.assertEqual(out_string, result.output)
+        self.assertEqual(result.exit_code, 0)
+
+    # Test the stats command
+    def test_compute_stats(self) -> None:
+        """Test the per-commodity and per-country summaries"""
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/test_extended.json"
+        commodity_stats, country_stats = compute_stats(
+            iter(parse_json(path)), trade_volume=405)
+
+        mango = commodity_stats["mango"]
+        self.assertEqual(mango.count, 6)
+        self.assertEqual(mango.fixed_min, 4.0)
+        self.assertEqual(mango.fixed_max, 50.0)
+        self.assertAlmostEqual(mango.fixed_mean(), 121 / 6)
+        self.assertEqual(mango.variable_min, 0.95)
+        self.assertEqual(mango.variable_max, 2.24)
+        self.assertEqual(mango.cheapest, "PH")
+
+        brazil = country_stats["BR"]
+        self.assertEqual(brazil.count, 3)
+        self.assertAlmostEqual(brazil.variable_mean(), 13.72 / 3)
+        self.assertEqual(sorted(country_stats), 
+                         ["BR", "FR", "MX", "MY", "PH", "US"])
+
+    def test_cli_stats(self) -> None:
+        """
+        Test the cli stats command from the data file and the store
+        """
+        cwd = os.getcwd()
+        runner = CliRunner()
+        file_path = f"--file_path={cwd}/Data/test_extended.json"
+        store = f"--store={self.temp_path('feed.db')}"
+        out_string = (
+            "mango           6 |    4.00   50.00   20.17 |"
+            "  0.95  2.24  1.43 | PH\n"
+        )
+        for options in [[file_path], [file_path, store]]:
+            result = runner.invoke(fruit_vendor, ["stats", *options])
+            self.assertIn("COMMODITY:\n", result.output)
+            self.assertIn(out_string, result.output)
+            self.assertIn(
+                "BR              3 |   20.00   29.50   23.50 |"
+                "  1.42 10.42  4.57\n", result.output)
+            self.assertEqual(result.exit_code, 0)
+
+    # Test the load test harness
+    def test_loadtest_requests(self) -> None:
+        """Test the request mix is parsed and generated reproducibly"""
+        weights = parse_mix("Mango=3,apple")
+        self.assertEqual(weights, {"mango": 3.0, "apple": 1.0})
+        requests = make_requests(weights, 100, seed=1)
+        self.assertEqual(requests, make_requests(weights, 100, seed=1))
+        self.assertEqual(len(requests), 100)
+        self.assertEqual({request[0] for request in requests}, 
+                         {"mango", "apple"})
+
+    def test_loadtest_summarise(self) -> None:
+        """Test the latency percentiles and throughput"""
+        latencies = [index / 1000 for index in range(100, 0, -1)]
+        summary = summarise(latencies, 0, 2.0, 1024)
+        self.assertEqual(summary["requests"], 100)
+        self.assertEqual(summary["throughput"], 50.0)
+        self.assertEqual(summary["p50"], 0.050)
+        self.assertEqual(summary["p95"], 0.095)
+        self.assertEqual(summary["p99"], 0.099)
+        self.assertEqual(summary["max"], 0.100)
+
+        # Failed requests are only counted as errors
+        summary = summarise(latencies[50:], 50, 2.0, 1024)
+        self.assertEqual(summary["requests"], 50)
+        self.assertEqual(summary["errors"], 50)
+        self.assertEqual(summary["throughput"], 25.0)
+        self.assertEqual(summary["max"], 0.050)
+
+        # A run without a successful request has no latencies
+        summary = summarise([], 0, 0.0)
+        self.assertEqual(summary["throughput"], 0.0)
+        self.assertIsNone(summary["p99"])
+
+    def test_loadtest_compare(self) -> None:
+        """Test regressions against the baseline are flagged"""
+        baseline = {"inprocess-10-c1": {"p50": 0.010, "p95": 0.020,
+                                        "p99": 0.030, "throughput": 100,
+                                        "peak_allocated_kb": 1000}}
+        results = {"inprocess-10-c1": {"p50": 0.011, "p95": 0.020,
+                                       "p99": 0.040, "throughput": 70,
+                                       "peak_allocated_kb": 1500},
+                   "server-10-c1": {"p50": 1, "p95": 1, "p99": 1,
+                                    "throughput": 1, "max_rss_kb": 1}}
+        regressions = compare(results, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 3)
+        self.assertIn("p99", regressions[0])
+        self.assertIn("throughput", regressions[1])
+        self.assertIn("peak_allocated_kb", regressions[2])
+
+    def test_loadtest_inprocess(self) -> None:
+        """Test an in-process load test run"""
+        cwd = os.getcwd()
+        fruit_list = parse_json(f"{cwd}/Data/test_extended.json")
+        requests = make_requests({"mango": 1, "kiwi": 1}, 50, seed=0)
+        summary = run_inprocess(fruit_list, requests, concurrency=4)
+        self.assertEqual(summary["requests"], 50)
+        self.assertEqual(summary["errors"], 0)
+        self.assertGreater(summary["peak_allocated_kb"], 0)
+        self.assertIsNone(summary["max_rss_kb"])
+
+    def test_loadtest_server(self) -> None:
+        """Test a load test run against a spawned quote server"""
+        cwd = os.getcwd()
+        path = f"{cwd}/Data/test_extended.json"
+        requests = make_requests({"mango": 1, "kiwi": 1}, 50, seed=0)
+        summary = run_server(path, requests, concurrency=4)
+        self.assertEqual(summary["requests"], 50)
+        self.assertEqual(summary["errors"], 0)
+        self.assertIsNone(summary["peak_allocated_kb"])
+
 def run_test() -> None:
     # Make sure that you are running the test file from its 
     # working directory
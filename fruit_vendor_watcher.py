@@ -5,33 +5,52 @@ This file runs in the background once started and waits for the JSON text
 file to change. Once it has detected a change it parses the JSON and 
 translates it into a python dict that is available for import by the 
 fruit_vendor_cli file. Not implemented yet.
+
+Compressed feeds (.gz, .zst, .xz) are recognised and decompressed as
+they are parsed. Each reload of the feed file is recorded as a version
+in the feed history rather than overwriting the previous feed. Other
+feed files in the directory are parsed but not recorded, so the
+history only ever holds versions of the one feed.
 """
-import json
 from watchdog.observers import Observer  
 from watchdog.events import PatternMatchingEventHandler 
 
 import os
 import time
 
-FRUIT_DICT = {}
+from fruit_vendor_history import FeedHistory
+from fruit_vendor_parse import COMPRESSION_EXTENSIONS, parse_file
 
-def getJson()->dict:
-    cwd = os.getcwd()
+FRUIT_DICT = {}
 
-    fruit_vendor_dict = { "COUNTRIES": set(), "FRUITS": set() }
+# Feed files watched in the Data directory, plain or compressed
+FEED_PATTERNS = [
+    f"*{extension}{compression}"
+    for extension in [".json", ".txt"]
+    for compression in ["", *COMPRESSION_EXTENSIONS]
+]
 
+def getJson(file_path: str = None, history: FeedHistory = None)->dict:
+    if file_path is None:
+        cwd = os.getcwd()
+        file_path = cwd+"/Data/fruit_data.json"
 
-    with open(cwd+"/Data/fruit_data.txt") as fruit_data:
-        data = json.load(fruit_data)
-        for entry in data:
-            country = entry["COUNTRY"]
-            fruit = entry["COMMODITY"]
-            for k,v in entry.items():
-                if k not in ["COUNTRY","COMMODITY"]:
-                    fruit_vendor_dict.setdefault(fruit, {}).setdefault(country,{})[k] = v
+    fruit_vendor_dict = { "COUNTRIES": set(), "FRUITS": set() }
 
-            fruit_vendor_dict["COUNTRIES"].add(country)
-            fruit_vendor_dict["FRUITS"].add(fruit)
+    # parse_file streams the feed, decompressing it if needed
+    fruit_list = parse_file(file_path)
+    if history is not None:
+        history.record(fruit_list)
+    for entry in fruit_list:
+        country = entry.country
+        fruit = entry.commodity
+        fruit_vendor_dict.setdefault(fruit, {})[country] = {
+            "FIXED_OVERHEAD": entry.fixed_overhead,
+            "VARIABLE_OVERHEAD": entry.variable_overhead,
+        }
+
+        fruit_vendor_dict["COUNTRIES"].add(country)
+        fruit_vendor_dict["FRUITS"].add(fruit)
     return fruit_vendor_dict
 
 
@@ -40,9 +59,18 @@ class MyWatcher(PatternMatchingEventHandler):
     """
     This class is based on the PatternMatchingEventHandler class from watchdog.
     This class looks for files in a specific dir that match the pattern when a
-    new one is created or a current one is modified.
+    new one is created or a current one is modified. Only changes to the
+    feed file are recorded in the feed history.
     """
-    pattern=["*.txt"]
+    def __init__(self, patterns: list = None, history: FeedHistory = None,
+                 feed_path: str = None) -> None:
+        super().__init__(patterns=patterns or FEED_PATTERNS,
+                         ignore_directories=True)
+        self.history = history or FeedHistory()
+        if feed_path is None:
+            cwd = os.getcwd()
+            feed_path = cwd + "/Data/fruit_data.json"
+        self.feed_path = os.path.abspath(feed_path)
 
 
     def parse_json_on_event(self, event)->None:
@@ -60,9 +88,13 @@ class MyWatcher(PatternMatchingEventHandler):
 
         """
 
-        # Open the flat file fruit_data.txt from the Data/ directory
+        # Parse the feed file that triggered the event. Only the feed
+        # file itself is recorded as a new version.
+        history = None
+        if os.path.abspath(event.src_path) == self.feed_path:
+            history = self.history
         print("parsing JSON!!")
-        FRUIT_DICT = getJson()
+        FRUIT_DICT = getJson(event.src_path, history)
         print("finished parsing JSON!!")
         print(FRUIT_DICT)
             